@@ -0,0 +1,96 @@
+"""Shared outbound HTTP client for main.py and py.py.
+
+Keeps one keep-alive requests.Session per host so repeated Spotify, image
+and token calls reuse TCP/TLS connections, applies a common retry policy
+and records per-host latency.
+"""
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_MAXSIZE = 16            # keep-alive connections kept per host
+RETRY_TOTAL = 2
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (502, 503, 504)
+DEFAULT_TIMEOUT = 10
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class HttpClient:
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, retries=RETRY_TOTAL):
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.sessions = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def _new_session(self):
+        # Only idempotent methods are retried; token exchanges (POST) are not
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = USER_AGENT
+        return session
+
+    def session_for(self, host):
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = self.sessions[host] = self._new_session()
+                self.stats[host] = {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+            return session
+
+    def _record(self, host, elapsed_ms, failed):
+        with self.lock:
+            stats = self.stats[host]
+            stats["requests"] += 1
+            stats["errors"] += int(failed)
+            stats["total_ms"] += elapsed_ms
+            stats["last_ms"] = elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def request(self, method, url, **kwargs):
+        host = urllib.parse.urlsplit(url).netloc
+        session = self.session_for(host)
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        start = time.perf_counter()
+        try:
+            resp = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, (time.perf_counter() - start) * 1000, True)
+            raise
+        self._record(host, (time.perf_counter() - start) * 1000, resp.status_code >= 500)
+        return resp
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def metrics(self):
+        """Per-host request counts and latency in milliseconds"""
+        with self.lock:
+            return {
+                host: dict(stats, avg_ms=round(stats["total_ms"] / stats["requests"], 1) if stats["requests"] else 0.0)
+                for host, stats in self.stats.items()
+            }
+
+
+http_client = HttpClient()
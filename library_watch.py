@@ -0,0 +1,219 @@
+"""Directory watcher that keeps the main.py and py.py library catalogs current.
+
+On Linux the watcher reads inotify events through ctypes; anywhere else (or
+if inotify cannot be set up) it falls back to polling the directory in a
+background thread and diffing (size, mtime) snapshots. Either way the
+catalog owner gets one callback per file change:
+
+    callback(kind, path, dest=None)
+
+kind is "created", "modified", "deleted", "moved" (path -> dest) or
+"rescan". "rescan" (path is the directory) means events may have been lost,
+e.g. after an inotify queue overflow, and the catalog should reconcile with
+a full listing.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+POLL_INTERVAL = 5            # seconds between snapshots in polling mode
+INOTIFY_READ_SIZE = 64 * 1024
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class DirectoryWatcher:
+    def __init__(self, directory, callback, suffixes=None, poll_interval=POLL_INTERVAL, backend=None):
+        self.directory = directory
+        self.callback = callback
+        self.suffixes = tuple(suffixes) if suffixes else None
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.stopped = threading.Event()
+        self.thread = None
+        self.fd = None
+        self.events = 0
+        self.rescans = 0
+
+    def wants(self, name):
+        return self.suffixes is None or name.lower().endswith(self.suffixes)
+
+    def start(self):
+        """Start watching in a daemon thread; returns the backend in use"""
+        if self.backend in (None, 'inotify'):
+            self.fd = self._open_inotify()
+        self.backend = 'inotify' if self.fd is not None else 'polling'
+        target = self._inotify_loop if self.fd is not None else self._poll_loop
+        self.thread = threading.Thread(target=target, name=f"watch:{self.directory}", daemon=True)
+        self.thread.start()
+        return self.backend
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+
+    def _emit(self, kind, path, dest=None):
+        self.events += 1
+        if kind == 'rescan':
+            self.rescans += 1
+        try:
+            self.callback(kind, path, dest)
+        except Exception as e:
+            logging.error(f"Library watcher callback failed for {kind} {path}: {e}")
+
+    # -- inotify ------------------------------------------------------------
+
+    def _open_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), WATCH_MASK) < 0:
+            logging.warning(f"inotify_add_watch failed for {self.directory} (errno {ctypes.get_errno()}), polling instead")
+            os.close(fd)
+            return None
+        return fd
+
+    def _inotify_loop(self):
+        try:
+            self._consume_inotify()
+        finally:
+            os.close(self.fd)
+            self.fd = None
+        if not self.stopped.is_set():
+            # The directory itself went away; polling copes with it reappearing
+            self._poll_loop()
+
+    def _consume_inotify(self):
+        created = set()
+        while not self.stopped.is_set():
+            ready, _, _ = select.select([self.fd], [], [], 1.0)
+            if not ready:
+                continue
+            moves = {}
+            for mask, cookie, name in self._read_events():
+                if mask & IN_Q_OVERFLOW:
+                    created.clear()
+                    self._emit('rescan', self.directory)
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    self._emit('rescan', self.directory)
+                    return
+                if mask & IN_ISDIR or not name or not self.wants(name):
+                    continue
+                path = os.path.join(self.directory, name)
+                if mask & IN_CREATE:
+                    created.add(path)
+                elif mask & IN_CLOSE_WRITE:
+                    self._emit('created' if path in created else 'modified', path)
+                    created.discard(path)
+                elif mask & IN_ATTRIB and path not in created:
+                    self._emit('modified', path)
+                elif mask & IN_DELETE:
+                    created.discard(path)
+                    self._emit('deleted', path)
+                elif mask & IN_MOVED_FROM:
+                    moves[cookie] = path
+                elif mask & IN_MOVED_TO:
+                    source = moves.pop(cookie, None)
+                    if source:
+                        self._emit('moved', source, path)
+                    else:
+                        self._emit('created', path)
+            # Moved out of the directory (or renamed to an unwatched suffix)
+            for source in moves.values():
+                self._emit('deleted', source)
+
+    def _read_events(self):
+        try:
+            buf = os.read(self.fd, INOTIFY_READ_SIZE)
+        except OSError:
+            return
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(buf):
+            _, mask, cookie, length = EVENT_HEADER.unpack_from(buf, pos)
+            pos += EVENT_HEADER.size
+            name = os.fsdecode(buf[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            yield mask, cookie, name
+
+    # -- polling ------------------------------------------------------------
+
+    def snapshot(self):
+        files = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for dirent in it:
+                    if not self.wants(dirent.name) or not dirent.is_file():
+                        continue
+                    st = dirent.stat()
+                    files[dirent.path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
+        return files
+
+    def _poll_loop(self):
+        self.backend = 'polling'
+        previous = self.snapshot()
+        while not self.stopped.wait(self.poll_interval):
+            current = self.snapshot()
+            if current is None or previous is None:
+                if current is not None:
+                    self._emit('rescan', self.directory)
+                previous = current
+                continue
+            removed = {path: sig for path, sig in previous.items() if path not in current}
+            # A rename keeps size and mtime, so pair removals with additions by signature
+            renamed_from = {sig: path for path, sig in removed.items()}
+            for path, sig in current.items():
+                old = previous.get(path)
+                if old is None:
+                    source = renamed_from.pop(sig, None)
+                    if source:
+                        removed.pop(source)
+                        self._emit('moved', source, path)
+                    else:
+                        self._emit('created', path)
+                elif old != sig:
+                    self._emit('modified', path)
+            for path in removed:
+                self._emit('deleted', path)
+            previous = current
+
+    def stats(self):
+        return {"directory": self.directory, "backend": self.backend,
+                "events": self.events, "rescans": self.rescans}
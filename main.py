@@ -9,15 +9,44 @@ import subprocess
 import base64
 import mimetypes
 import io
+import asyncio
+import uuid
+import email.utils
+import re
+import sqlite3
+import itertools
+import hashlib
+import queue
+import gzip
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from socketserver import ThreadingMixIn
 
 # Third-party imports
 import requests
 import yt_dlp
+from requests.adapters import HTTPAdapter
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, APIC, TIT2, TPE1, TALB, TCON
 
+from http_pool import http_client, USER_AGENT
+from library_watch import DirectoryWatcher
+from ytdl_pool import extractor_pool
+
+# Optional: Pillow is only needed to resize cover art
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Optional: brotli adds a "br" encoding for the frontend
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # -----------------------------------------------------------------------------
 # CONFIGURATION
 # -----------------------------------------------------------------------------
@@ -28,19 +57,96 @@ REDIRECT_URI = "https://musicc-oyb7.onrender.com/callback"
 PORT = 5000
 DOWNLOAD_DIR = os.path.join(os.getcwd(), "music_library")
 STREAM_CACHE_FILE = os.path.join(os.getcwd(), "stream_cache.json")
+STREAM_CACHE_DB = os.path.join(os.getcwd(), "stream_cache.db")
+STREAM_CACHE_MEMORY_ITEMS = 2000
+STREAM_CACHE_DEFAULT_TTL = 6 * 3600      # used when a URL carries no expire= param
+STREAM_CACHE_EXPIRY_MARGIN = 300         # stop serving URLs this many seconds before they expire
+STREAM_CACHE_COMPACT_INTERVAL = 600
+LIBRARY_INDEX_DB = os.path.join(os.getcwd(), "library_index.db")
+LIBRARY_RESCAN_INTERVAL = 30            # full stat pass even if the directory mtime is unchanged
+# Keep the library index current from filesystem events instead of rescans (set LIBRARY_WATCH=0 to disable)
+LIBRARY_WATCH = os.environ.get("LIBRARY_WATCH", "1") != "0"
+LIBRARY_EVENT_QUEUE = 256               # pending change notifications per /api/library/events client
+LIBRARY_EVENTS_HEARTBEAT = 15
+LIBRARY_EVENTS_MAX_AGE = 300            # event streams end after this; EventSource reconnects on its own
+LIBRARY_EVENTS_MAX_SUBSCRIBERS = 64     # open /api/library/events streams; more get 503
+COVER_CACHE_DIR = os.path.join(os.getcwd(), "cover_cache")
+COVER_VARIANTS = {"64": 64, "256": 256, "full": None}
+COVER_MEMORY_BYTES = 32 * 1024 * 1024
+COVER_DISK_BYTES = 256 * 1024 * 1024    # cover_cache/ is pruned least-recently-built first past this
+COVER_MAX_AGE = 3600
+RELAY_CACHE_DIR = os.path.join(os.getcwd(), "relay_cache")
+RELAY_CHUNK_SIZE = 256 * 1024           # unit of caching for relayed YouTube audio
+RELAY_FETCH_CHUNKS = 4                  # missing chunks fetched per upstream request
+RELAY_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RELAY_POOL_SIZE = 8                     # keep-alive connections per googlevideo host for the relay
+RELAY_READ_SIZE = 64 * 1024             # upstream bytes read per iter_content step
+DOWNLOAD_WORKERS = 2
+DOWNLOAD_QUEUE_FILE = os.path.join(os.getcwd(), "download_queue.json")
+DOWNLOAD_HISTORY_LIMIT = 200
+# Pipelined downloads: one ffmpeg reads the source URL and writes the tagged MP3 directly
+DOWNLOAD_PIPELINE = os.environ.get("DOWNLOAD_PIPELINE", "1") != "0"
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN") or shutil.which("ffmpeg")
+DOWNLOAD_BITRATE = "192k"
+COVER_FETCH_TIMEOUT = 10
+ASSET_MAX_AGE = 365 * 24 * 3600          # content-hashed assets never change
+SEARCH_CACHE_TTL = 600                   # served as fresh
+SEARCH_CACHE_STALE_TTL = 6 * 3600        # served while a background refresh runs
+SEARCH_CACHE_MAX_ENTRIES = 1000
+# Optional: resolve stream URLs for the top search results before the user clicks.
+# Off by default since each search then costs up to STREAM_PREFETCH_TOP_N extra yt-dlp
+# extractions; enable with STREAM_PREFETCH=1
+STREAM_PREFETCH = os.environ.get("STREAM_PREFETCH", "0") != "0"
+STREAM_PREFETCH_TOP_N = 5               # default per search; ?prefetch=N overrides, up to MAX_N
+STREAM_PREFETCH_MAX_N = 10
+STREAM_PREFETCH_WORKERS = 2
+STREAM_PREFETCH_MAX_PENDING = 20
+STREAM_PREFETCH_RESERVED = 1            # extractor instances always left free for real plays
+
+# Server mode: "threaded" (one thread per request) or "async" (event loop + bounded executor)
+SERVER_MODE = os.environ.get("SERVER_MODE", "threaded")
+ASYNC_WORKERS = 32                      # handler threads for ordinary requests in async mode
+# Relayed audio and the liked-songs stream write for as long as the client listens; they get
+# their own threads so they cannot starve ASYNC_WORKERS (relay pool slots + queue, plus headroom)
+ASYNC_STREAM_WORKERS = 24
+KEEPALIVE_TIMEOUT = 15
+FILE_CHUNK_SIZE = 64 * 1024
+STREAM_FLUSH_BYTES = 16 * 1024          # buffered output size before a streamed chunk is sent
+STREAM_JSON_MIN_ITEMS = 1000            # send_json streams lists at least this long
+# Blocking routes are limited per class: (concurrent requests, max waiting) before answering 503
+ROUTE_POOLS = {
+    "extraction": (4, 8),               # yt-dlp lookups: /api/yt-stream, /api/search-yt
+    "metadata": (4, 32),                # mutagen and cover I/O: /api/cover, /api/library
+    "proxy": (6, 16),                   # Spotify calls: /api/spotify, /callback
+    "relay": (8, 8),                    # relayed audio streams: /api/yt-audio/
+    "events": (LIBRARY_EVENTS_MAX_SUBSCRIBERS, 0),  # threaded-mode /api/library/events streams
+}
+OVERLOAD_RETRY_AFTER_MAX = 30
+
+# Spotify liked-songs pagination
+SPOTIFY_PAGE_SIZE = 50
+SPOTIFY_PAGE_WORKERS = 6
+SPOTIFY_MAX_RETRIES = 4
+SPOTIFY_TOKEN_FILE = os.path.join(os.getcwd(), "spotify_tokens.json")
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+SPOTIFY_REFRESH_MARGIN = 120            # refresh this many seconds before the token expires
+SPOTIFY_USER_LOOKUP_BACKOFF = 60        # wait this long before retrying a failed /me lookup
+# Shared cache for the generic /api/spotify proxy
+SPOTIFY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+SPOTIFY_CACHE_MAX_ENTRY_BYTES = 2 * 1024 * 1024
+SPOTIFY_CACHE_DEFAULT_TTL = 60          # freshness when Spotify sends no Cache-Control
 
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+os.makedirs(COVER_CACHE_DIR, exist_ok=True)
 
 # Global State
 auth_state = {
     "access_token": None,
     "refresh_token": None,
-    "expires_at": 0
+    "expires_at": 0,
+    "user_id": None
 }
 
-# Lock for thread-safe file operations
-stream_cache_lock = threading.Lock()
-
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -1477,7 +1583,7 @@ HTML_CONTENT = """
             row.className = 'queue-item';
             let imgUrl = 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" width="32" height="32"%3E%3Crect fill="%232a2a2a" width="32" height="32"/%3E%3C/svg%3E';
             if (track.album?.images?.[2]?.url) imgUrl = track.album.images[2].url;
-            else if (track.path) imgUrl = `/api/cover?path=${encodeURIComponent(track.path)}`;
+            else if (track.path) imgUrl = `/api/cover?path=${encodeURIComponent(track.path)}&size=64`;
             else if (currentParentCover) imgUrl = currentParentCover;
 
             let name = track.name || track.title;
@@ -2313,11 +2419,17 @@ async function openArtist(item) {
         const tracksDiv = document.getElementById('detail-tracks');
         tracksDiv.innerHTML = '<div class="spinner"></div>';
         
-        const data = await spotifyFetch('/me/tracks');
-        
-        if(data && data.items) {
-            renderTracks(data.items, false, false);
-        } else {
+        if(!token) await checkAuth();
+        try {
+            // Rows are appended page by page while the server is still paging through Spotify
+            let started = false;
+            const count = await streamNdjson('/api/spotify/me/tracks?format=ndjson', items => {
+                renderTracks(items, false, started);
+                started = true;
+            }, { headers: { 'Authorization': `Bearer ${token}` } });
+            if(count === 0) renderTracks([], false, false);
+        } catch(e) {
+            console.error('Liked songs error:', e);
             tracksDiv.innerHTML = '<div style="padding:20px; color:var(--error)">Error loading songs. Check console or try logging out and back in.</div>';
         }
     }
@@ -2413,8 +2525,10 @@ function openSimilarModal(title, artist) {
             const res = await fetch(`/api/yt-stream?id=${videoId}`);
             const data = await res.json();
             if(data.url) {
-                playPreview(data.url, `yt-${videoId}`, title, artist, thumbnail, null);
-                setStreamUrl(`yt-${videoId}`, data.url);
+                // The relay survives upstream URL expiry and serves replays from the server's cache
+                const streamUrl = data.relay_url || data.url;
+                playPreview(streamUrl, `yt-${videoId}`, title, artist, thumbnail, null);
+                setStreamUrl(`yt-${videoId}`, streamUrl);
             } else {
                 setLoading(false);
                 showStatus("Failed to get stream", true);
@@ -2633,54 +2747,46 @@ function openSimilarModal(title, artist) {
         }
     }
 
+    // Read a newline-delimited JSON response, calling onBatch with each group of parsed lines as it arrives
+    async function streamNdjson(url, onBatch, options = {}) {
+        const res = await fetch(url, options);
+        if(!res.ok) throw new Error(`HTTP ${res.status}`);
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let pending = '';
+        let count = 0;
+        while(true) {
+            const { done, value } = await reader.read();
+            pending += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = pending.split('\\n');
+            pending = done ? '' : lines.pop();
+            const items = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+            if(items.length) {
+                count += items.length;
+                onBatch(items);
+            }
+            if(done) return count;
+        }
+    }
+
     async function loadLibrary() {
         try {
-            const res = await fetch('/api/library');
-            const files = await res.json();
             const div = document.getElementById('library-list');
-            div.innerHTML = '';
-            currentTrackList = [];
-            libraryTracks = []; 
-            
-            if(files.length === 0) {
+            let started = false;
+            const count = await streamNdjson('/api/library?format=ndjson', files => {
+                if(!started) {
+                    div.innerHTML = '';
+                    currentTrackList = [];
+                    libraryTracks = [];
+                    started = true;
+                }
+                renderLibraryRows(div, files);
+            });
+
+            if(count === 0) {
                 div.innerHTML = '<div style="padding:20px; text-align:center; color: var(--text-sub);">No downloads yet</div>';
                 return;
             }
-            
-            files.forEach(f => {
-                libraryTracks.push(f);
-                
-                const row = document.createElement('div');
-                row.className = 'list-item';
-                const domId = `file-${f.path.replace(/[^a-zA-Z0-9]/g, '_')}`;
-                row.id = `track-row-${domId}`; 
-                
-                currentTrackList.push(f);
-
-                const coverUrl = `/api/cover?path=${encodeURIComponent(f.path)}`;
-                const genericCover = 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" width="44" height="44"%3E%3Crect fill="%232a2a2a" width="44" height="44"/%3E%3C/svg%3E';
-                const duration = f.duration ? formatTime(f.duration) : '';
-
-                row.innerHTML = `
-                    <img src="${coverUrl}" onerror="this.src='${genericCover}'" style="width:44px; height:44px; margin-right:0.75rem; border-radius:6px; object-fit:cover;">
-                    <div class="list-info" onclick='playLocal("${f.path}", "${escapeHtml(f.title)}", "${escapeHtml(f.artist)}", "${domId}")'>
-                        <div class="equalizer hidden" id="eq-${domId}">
-                            <div class="bar"></div>
-                            <div class="bar"></div>
-                            <div class="bar"></div>
-                        </div>
-                        <div>
-                            <div style="font-weight:500">${escapeHtml(f.title)}</div>
-                            <div class="card-sub">${escapeHtml(f.artist)}</div>
-                        </div>
-                    </div>
-                    <div class="list-meta">${duration}</div>
-                    <div class="list-actions">
-                         <button class="action-btn" onclick='event.stopPropagation(); playLocal("${f.path}", "${escapeHtml(f.title)}", "${escapeHtml(f.artist)}", "${domId}")'>Play</button>
-                    </div>
-                `;
-                div.appendChild(row);
-            });
             restorePlayerState();
         } catch(e) {
             console.error('Library load error:', e);
@@ -2688,8 +2794,45 @@ function openSimilarModal(title, artist) {
         }
     }
 
+    function renderLibraryRows(div, files) {
+        files.forEach(f => {
+            libraryTracks.push(f);
+            
+            const row = document.createElement('div');
+            row.className = 'list-item';
+            const domId = `file-${f.path.replace(/[^a-zA-Z0-9]/g, '_')}`;
+            row.id = `track-row-${domId}`; 
+            
+            currentTrackList.push(f);
+
+            const coverUrl = `/api/cover?path=${encodeURIComponent(f.path)}&size=64`;
+            const genericCover = 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" width="44" height="44"%3E%3Crect fill="%232a2a2a" width="44" height="44"/%3E%3C/svg%3E';
+            const duration = f.duration ? formatTime(f.duration) : '';
+
+            row.innerHTML = `
+                <img src="${coverUrl}" onerror="this.src='${genericCover}'" style="width:44px; height:44px; margin-right:0.75rem; border-radius:6px; object-fit:cover;">
+                <div class="list-info" onclick='playLocal("${f.path}", "${escapeHtml(f.title)}", "${escapeHtml(f.artist)}", "${domId}")'>
+                    <div class="equalizer hidden" id="eq-${domId}">
+                        <div class="bar"></div>
+                        <div class="bar"></div>
+                        <div class="bar"></div>
+                    </div>
+                    <div>
+                        <div style="font-weight:500">${escapeHtml(f.title)}</div>
+                        <div class="card-sub">${escapeHtml(f.artist)}</div>
+                    </div>
+                </div>
+                <div class="list-meta">${duration}</div>
+                <div class="list-actions">
+                     <button class="action-btn" onclick='event.stopPropagation(); playLocal("${f.path}", "${escapeHtml(f.title)}", "${escapeHtml(f.artist)}", "${domId}")'>Play</button>
+                </div>
+            `;
+            div.appendChild(row);
+        });
+    }
+
     function playLocal(path, title, artist, id) {
-        const coverUrl = `/api/cover?path=${encodeURIComponent(path)}`;
+        const coverUrl = `/api/cover?path=${encodeURIComponent(path)}&size=256`;
         const audio = document.getElementById('audio-player');
         audio.src = `/api/files?path=${encodeURIComponent(path)}`;
         
@@ -2752,7 +2895,21 @@ function openSimilarModal(title, artist) {
         showStatus("Playback Error", true);
     };
 
+    // Reload the library view when the server reports files added, changed or removed
+    let libraryReloadTimer = null;
+    function watchLibrary() {
+        if(!window.EventSource) return;
+        const events = new EventSource('/api/library/events');
+        const onChange = () => {
+            if(document.getElementById('view-library').classList.contains('hidden')) return;
+            clearTimeout(libraryReloadTimer);
+            libraryReloadTimer = setTimeout(loadLibrary, 500);
+        };
+        ['created', 'modified', 'deleted', 'rescan'].forEach(type => events.addEventListener(type, onChange));
+    }
+
     checkAuth().then(() => { loadView('home'); });
+    watchLibrary();
 </script>
 </body>
 </html>
@@ -2762,17 +2919,276 @@ function openSimilarModal(title, artist) {
 # BACKEND LOGIC
 # -----------------------------------------------------------------------------
 
+class SpotifyTokenManager:
+    """Keeps auth_state valid: proactive refresh, coalesced refreshes and persistence"""
+    def __init__(self, state, token_file=SPOTIFY_TOKEN_FILE, margin=SPOTIFY_REFRESH_MARGIN):
+        self.state = state
+        self.token_file = token_file
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.user_lock = threading.Lock()
+        self.user_lookup_after = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.load()
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+
+    def load(self):
+        try:
+            if os.path.exists(self.token_file):
+                with open(self.token_file, 'r') as f:
+                    saved = json.load(f)
+                self.state.update({k: saved.get(k) for k in ('access_token', 'refresh_token', 'expires_at', 'user_id')})
+                self.state['expires_at'] = self.state['expires_at'] or 0
+                logging.info("Restored Spotify session from disk")
+        except Exception as e:
+            logging.error(f"Could not load saved Spotify tokens: {e}")
+
+    def save(self):
+        tmp = self.token_file + '.tmp'
+        try:
+            # Tokens are credentials: keep the file private to this user
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.token_file)
+        except Exception as e:
+            logging.error(f"Could not save Spotify tokens: {e}")
+
+    def clear(self):
+        with self.lock:
+            self.state.update(access_token=None, refresh_token=None, expires_at=0, user_id=None)
+            try:
+                os.remove(self.token_file)
+            except FileNotFoundError:
+                pass
+
+    def _token_request(self, data):
+        auth_str = base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
+        return http_client.post(
+            SPOTIFY_TOKEN_URL,
+            data=data,
+            headers={
+                "Authorization": f"Basic {auth_str}",
+                "Content-Type": "application/x-www-form-urlencoded"
+            },
+            timeout=10
+        )
+
+    def _store(self, data):
+        self.state['access_token'] = data['access_token']
+        # Refresh responses usually omit refresh_token; keep the old one then
+        self.state['refresh_token'] = data.get('refresh_token') or self.state.get('refresh_token')
+        self.state['expires_at'] = time.time() + data.get('expires_in', 3600)
+        self.save()
+
+    def exchange_code(self, code):
+        """Trade an authorization code for tokens; returns the token endpoint response"""
+        resp = self._token_request({
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": REDIRECT_URI
+        })
+        if resp.status_code == 200:
+            with self.lock:
+                # Possibly a different account: look its id up again on first use
+                self.state['user_id'] = None
+                self.user_lookup_after = 0
+                self._store(resp.json())
+        return resp
+
+    def refresh(self, stale_token=None):
+        """Refresh the access token once, however many threads ask at the same time.
+
+        stale_token is the token the caller saw fail or expire; if another
+        thread has replaced it in the meantime no request is made.
+        """
+        with self.lock:
+            if stale_token is not None and self.state['access_token'] != stale_token:
+                return True
+            if not self.state.get('refresh_token'):
+                return False
+            try:
+                resp = self._token_request({
+                    "grant_type": "refresh_token",
+                    "refresh_token": self.state['refresh_token']
+                })
+                if resp.status_code != 200:
+                    self.failures += 1
+                    logging.error(f"Spotify token refresh failed: {resp.status_code}")
+                    return False
+                self._store(resp.json())
+                self.refreshes += 1
+                logging.info("Spotify token refreshed")
+                return True
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Spotify token refresh error: {e}")
+                return False
+
+    def access_token(self):
+        """Current access token, refreshed first if it is about to expire"""
+        token = self.state['access_token']
+        if token and time.time() > self.state['expires_at'] - self.margin:
+            self.refresh(stale_token=token)
+        return self.state['access_token']
+
+    def status(self):
+        """Login state from the cached token and expiry; never waits on a refresh"""
+        token = self.state['access_token']
+        return {
+            "logged_in": token is not None,
+            "token": token,
+            "expires_in": max(int(self.state['expires_at'] - time.time()), 0) if token else 0,
+        }
+
+    def _refresh_loop(self):
+        while True:
+            token = self.state['access_token']
+            wait = self.state['expires_at'] - self.margin - time.time() if token else 60
+            if wait <= 0 and token:
+                if not self.refresh(stale_token=token):
+                    wait = 60
+            time.sleep(min(max(wait, 5), 60))
+
+    def user_id(self):
+        """Spotify user id of the signed-in account from /me, looked up once per login and saved.
+
+        Returns None while the id is unknown. Only one lookup runs at a time
+        and a failed one is not retried for SPOTIFY_USER_LOOKUP_BACKOFF
+        seconds, so a struggling Spotify does not get a /me per request.
+        """
+        if self.state.get('user_id') or not self.state.get('access_token'):
+            return self.state.get('user_id')
+        if time.time() < self.user_lookup_after or not self.user_lock.acquire(blocking=False):
+            return None
+        try:
+            if not self.state.get('user_id'):
+                resp = SpotifyProxy.get(SpotifyProxy.BASE_URL + '/me')
+                if resp.status_code == 200 and resp.json().get('id'):
+                    self.state['user_id'] = resp.json()['id']
+                    self.save()
+                else:
+                    logging.warning(f"Could not look up Spotify user id: {resp.status_code}")
+        except Exception as e:
+            logging.warning(f"Could not look up Spotify user id: {e}")
+        finally:
+            if not self.state.get('user_id'):
+                self.user_lookup_after = time.time() + SPOTIFY_USER_LOOKUP_BACKOFF
+            self.user_lock.release()
+        return self.state.get('user_id')
+
+    def scope(self):
+        """Stable id for the signed-in account, used to partition cached responses.
+
+        Refresh tokens can rotate, so this is keyed on the /me user id; until
+        that is known the current access token stands in.
+        """
+        user_id = self.user_id()
+        key = f"user:{user_id}" if user_id else f"token:{self.state.get('access_token') or ''}"
+        return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+    def stats(self):
+        return {
+            "logged_in": self.state['access_token'] is not None,
+            "expires_in": max(int(self.state['expires_at'] - time.time()), 0) if self.state['access_token'] else 0,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+token_manager = SpotifyTokenManager(auth_state)
+
 class SpotifyProxy:
     BASE_URL = "https://api.spotify.com/v1"
 
     @staticmethod
     def get_headers():
-        return {"Authorization": f"Bearer {auth_state['access_token']}"}
+        return {"Authorization": f"Bearer {token_manager.access_token()}"}
+
+    @staticmethod
+    def get(url, params=None, headers=None):
+        """GET from the Spotify API.
+
+        Waits out 429 Retry-After and retries a 401 once after refreshing the
+        token (5xx retries happen in http_client).
+        """
+        refreshed = False
+        for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+            request_headers = dict(headers or {}, **SpotifyProxy.get_headers())
+            resp = http_client.get(url, params=params, headers=request_headers)
+            if resp.status_code == 401 and not refreshed:
+                refreshed = True
+                if token_manager.refresh(stale_token=request_headers['Authorization'][len('Bearer '):]):
+                    resp = http_client.get(url, params=params, headers=dict(headers or {}, **SpotifyProxy.get_headers()))
+            if resp.status_code != 429:
+                return resp
+            try:
+                delay = float(resp.headers.get('Retry-After', 1))
+            except ValueError:
+                delay = 1.0
+            if attempt == SPOTIFY_MAX_RETRIES:
+                break
+            logging.warning(f"Spotify returned {resp.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+        return resp
+
+spotify_page_pool = ThreadPoolExecutor(max_workers=SPOTIFY_PAGE_WORKERS, thread_name_prefix='spotify-page')
+
+class SpotifyPageError(Exception):
+    pass
+
+def fetch_spotify_page(url, params, offset):
+    """Fetch one offset page of a Spotify paging object, returning its items.
+
+    Raises SpotifyPageError on a failed page so callers never mistake a
+    truncated list for the whole collection.
+    """
+    resp = SpotifyProxy.get(url, params=dict(params, offset=str(offset)))
+    if resp.status_code != 200:
+        logging.warning(f"Pagination failed at offset {offset}: {resp.status_code}")
+        raise SpotifyPageError(f"page at offset {offset} failed with {resp.status_code}")
+    return resp.json().get('items')
+
+def iter_spotify_pages(url, params, first_page):
+    """Yield item lists for every page after first_page, in order.
+
+    The remaining offsets are read from the first page's total and fetched
+    concurrently; pages are still yielded in offset order as they complete.
+    A failed page raises SpotifyPageError; an empty page (the collection
+    shrank meanwhile) ends the iteration.
+    """
+    start = int(params.get('offset', 0)) + len(first_page.get('items', []))
+    total = first_page.get('total', 0)
+    futures = [
+        spotify_page_pool.submit(fetch_spotify_page, url, params, offset)
+        for offset in range(start, total, SPOTIFY_PAGE_SIZE)
+    ]
+    try:
+        for future in futures:
+            items = future.result()
+            if not items:
+                break
+            yield items
+    finally:
+        for future in futures:
+            future.cancel()
 
 def sanitize_filename(name):
     """Remove invalid filename characters"""
     return "".join([c for c in name if c.isalnum() or c in (' ', '-', '_', '.')]).strip()[:200]
 
+def fetch_cover_art(image_url):
+    """Download album art, returning the image bytes or None"""
+    if not image_url:
+        return None
+    try:
+        img_resp = http_client.get(image_url, timeout=COVER_FETCH_TIMEOUT)
+        if img_resp.status_code == 200:
+            return img_resp.content
+    except Exception as e:
+        logging.warning(f"Failed to download album art from {image_url}: {e}")
+    return None
+
 def set_metadata(filepath, title, artist, album, image_url):
     """Add ID3 tags and album art to MP3 file"""
     try:
@@ -2786,84 +3202,255 @@ def set_metadata(filepath, title, artist, album, image_url):
         audio.tags.add(TALB(encoding=3, text=album or "Downloaded"))
         audio.tags.add(TCON(encoding=3, text="Spotify Downloader"))
 
-        if image_url:
-            try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                img_resp = requests.get(image_url, headers=headers, timeout=10)
-                if img_resp.status_code == 200:
-                    audio.tags.add(
-                        APIC(
-                            encoding=3,
-                            mime='image/jpeg',
-                            type=3,
-                            desc='Cover',
-                            data=img_resp.content
-                        )
-                    )
-            except Exception as e:
-                logging.warning(f"Failed to download album art from {image_url}: {e}")
+        cover = fetch_cover_art(image_url)
+        if cover:
+            audio.tags.add(
+                APIC(
+                    encoding=3,
+                    mime='image/jpeg',
+                    type=3,
+                    desc='Cover',
+                    data=cover
+                )
+            )
 
         audio.save()
         logging.info(f"Metadata added for: {title}")
     except Exception as e:
         logging.error(f"Metadata tagging failed for {title}: {e}")
 
+EXPIRE_PARAM_RE = re.compile(r'[?&/]expire[=/](\d+)')
+
+def stream_url_expiry(url):
+    """Return the time a googlevideo URL stops working, minus a safety margin"""
+    match = EXPIRE_PARAM_RE.search(url or '')
+    if match:
+        return int(match.group(1)) - STREAM_CACHE_EXPIRY_MARGIN
+    return time.time() + STREAM_CACHE_DEFAULT_TTL
+
+class StreamCache:
+    """Stream URL cache: in-memory LRU in front of a SQLite table, with expiry"""
+    def __init__(self, db_path, memory_items=STREAM_CACHE_MEMORY_ITEMS, compact_interval=STREAM_CACHE_COMPACT_INTERVAL):
+        self.memory_items = memory_items
+        self.compact_interval = compact_interval
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS stream_urls ('
+            'video_id TEXT PRIMARY KEY, url TEXT NOT NULL, expires_at REAL NOT NULL, cached_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+        self.import_legacy_file(STREAM_CACHE_FILE)
+
+        threading.Thread(target=self._compaction_loop, daemon=True).start()
+
+    def import_legacy_file(self, path):
+        """One-time import of the old stream_cache.json"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                legacy = json.load(f)
+            now = time.time()
+            rows = [(vid, url, stream_url_expiry(url), now) for vid, url in legacy.items()
+                    if stream_url_expiry(url) > now]
+            with self.lock:
+                self.conn.executemany('INSERT OR IGNORE INTO stream_urls VALUES (?, ?, ?, ?)', rows)
+                self.conn.commit()
+            os.replace(path, path + '.imported')
+            logging.info(f"Imported {len(rows)} live entries from {path}")
+        except Exception as e:
+            logging.error(f"Legacy stream cache import failed: {e}")
+
+    def _remember(self, video_id, url, expires_at):
+        self.memory[video_id] = (url, expires_at)
+        self.memory.move_to_end(video_id)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, video_id):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(video_id)
+            if entry is None:
+                row = self.conn.execute(
+                    'SELECT url, expires_at FROM stream_urls WHERE video_id = ?', (video_id,)
+                ).fetchone()
+                if row:
+                    entry = (row[0], row[1])
+                    self._remember(video_id, *entry)
+            else:
+                self.memory.move_to_end(video_id)
+
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= now:
+                self.expired += 1
+                self.misses += 1
+                self.memory.pop(video_id, None)
+                self.conn.execute('DELETE FROM stream_urls WHERE video_id = ?', (video_id,))
+                self.conn.commit()
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, video_id):
+        """True if an unexpired URL is cached; a probe, so it is not counted as a hit or miss"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(video_id)
+            if entry is None:
+                entry = self.conn.execute(
+                    'SELECT url, expires_at FROM stream_urls WHERE video_id = ?', (video_id,)
+                ).fetchone()
+            return entry is not None and entry[1] > now
+
+    def put(self, video_id, url):
+        expires_at = stream_url_expiry(url)
+        with self.lock:
+            self._remember(video_id, url, expires_at)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO stream_urls VALUES (?, ?, ?, ?)',
+                (video_id, url, expires_at, time.time())
+            )
+            self.conn.commit()
+
+    def invalidate(self, video_id):
+        with self.lock:
+            self.memory.pop(video_id, None)
+            self.conn.execute('DELETE FROM stream_urls WHERE video_id = ?', (video_id,))
+            self.conn.commit()
+
+    def compact(self):
+        """Drop expired entries from memory and disk"""
+        now = time.time()
+        with self.lock:
+            for video_id in [k for k, (_, exp) in self.memory.items() if exp <= now]:
+                del self.memory[video_id]
+            removed = self.conn.execute('DELETE FROM stream_urls WHERE expires_at <= ?', (now,)).rowcount
+            self.conn.commit()
+            if removed > 1000:
+                self.conn.execute('VACUUM')
+        if removed:
+            logging.info(f"Stream cache compaction removed {removed} expired entries")
+        return removed
+
+    def _compaction_loop(self):
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except Exception as e:
+                logging.error(f"Stream cache compaction error: {e}")
+
+    def stats(self):
+        with self.lock:
+            stored = self.conn.execute('SELECT COUNT(*) FROM stream_urls').fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "memory_entries": len(self.memory),
+                "stored_entries": stored,
+            }
+
+stream_cache = StreamCache(STREAM_CACHE_DB)
+
 def get_cached_stream_url(video_id):
-    """Check local file for cached stream URL"""
+    """Return a cached, unexpired stream URL"""
     try:
-        with stream_cache_lock:
-            if not os.path.exists(STREAM_CACHE_FILE):
-                return None
-            
-            with open(STREAM_CACHE_FILE, 'r') as f:
-                cache = json.load(f)
-                return cache.get(video_id)
+        return stream_cache.get(video_id)
     except Exception as e:
         logging.error(f"Cache read error: {e}")
         return None
 
 def save_stream_to_cache(video_id, url):
-    """Save stream URL to local file"""
+    """Save stream URL to the stream cache"""
     try:
-        with stream_cache_lock:
-            cache = {}
-            if os.path.exists(STREAM_CACHE_FILE):
-                try:
-                    with open(STREAM_CACHE_FILE, 'r') as f:
-                        cache = json.load(f)
-                except:
-                    # If file is corrupted, start fresh
-                    cache = {}
-            
-            cache[video_id] = url
-            with open(STREAM_CACHE_FILE, 'w') as f:
-                json.dump(cache, f)
-                
-            logging.info(f"Cached stream URL for {video_id}")
+        stream_cache.put(video_id, url)
+        logging.info(f"Cached stream URL for {video_id}")
     except Exception as e:
         logging.error(f"Cache write error: {e}")
 
+class SingleFlight:
+    """Runs at most one call per key; concurrent callers wait for and share its result"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = {"done": threading.Event(), "result": None, "error": None}
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn(*args)
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call["done"].set()
+
+    def stats(self):
+        with self.lock:
+            return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self.in_flight)}
+
+yt_stream_flight = SingleFlight()
+yt_stream_counters = {"hits": 0}
+yt_stream_counters_lock = threading.Lock()
+
 def get_youtube_stream_url(video_id):
     """Extract direct stream URL from YouTube video with server-side caching"""
     # 1. Check Cache first
     cached_url = get_cached_stream_url(video_id)
     if cached_url:
+        with yt_stream_counters_lock:
+            yt_stream_counters["hits"] += 1
         logging.info(f"Stream URL found in cache for {video_id}")
         return cached_url
 
-    # 2. If not in cache, fetch via yt-dlp
+    # 2. If not in cache, fetch via yt-dlp, sharing one extraction between concurrent callers
+    return yt_stream_flight.do(video_id, extract_youtube_stream_url, video_id)
+
+def yt_stream_stats():
+    flight = yt_stream_flight.stats()
+    with yt_stream_counters_lock:
+        hits = yt_stream_counters["hits"]
+    return {"hits": hits, "misses": flight["executions"], "coalesced": flight["coalesced"], "in_flight": flight["in_flight"]}
+
+def extract_youtube_stream_url(video_id):
+    """Run yt-dlp for a video and cache the resulting stream URL"""
+    # A previous flight may have filled the cache between our lookup and now
+    cached_url = get_cached_stream_url(video_id)
+    if cached_url:
+        return cached_url
+
     try:
         url = f"https://www.youtube.com/watch?v={video_id}"
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'noplaylist': True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with extractor_pool.acquire('extract') as ydl:
             info = ydl.extract_info(url, download=False)
             stream_url = None
             
@@ -2890,16 +3477,146 @@ def get_youtube_stream_url(video_id):
         logging.error(f"YT Stream Error: {e}")
         return None
 
+class StreamPrefetcher:
+    """Warms the stream cache for search results on a small bounded pool.
+
+    Prefetches share yt_stream_flight with real plays, so a click on a video
+    that is still being prefetched waits for that extraction instead of
+    starting another. Work is skipped rather than queued when the extractor
+    pool is nearly saturated or too many prefetches are pending.
+    """
+    def __init__(self, workers=STREAM_PREFETCH_WORKERS, max_pending=STREAM_PREFETCH_MAX_PENDING,
+                 reserved=STREAM_PREFETCH_RESERVED):
+        self.max_pending = max_pending
+        self.reserved = reserved
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stream-prefetch')
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.counts = {"scheduled": 0, "resolved": 0, "failed": 0, "already_cached": 0, "skipped_load": 0}
+
+    def overloaded(self):
+        return extractor_pool.in_use('extract') >= extractor_pool.size - self.reserved
+
+    def schedule(self, video_ids):
+        """Queue stream URL resolution for video_ids; returns how many were queued"""
+        queued = 0
+        for video_id in video_ids:
+            if not video_id:
+                continue
+            if stream_cache.contains(video_id):
+                with self.lock:
+                    self.counts["already_cached"] += 1
+                continue
+            with self.lock:
+                if video_id in self.pending:
+                    continue
+                if len(self.pending) >= self.max_pending or self.overloaded():
+                    self.counts["skipped_load"] += 1
+                    continue
+                self.pending.add(video_id)
+                self.counts["scheduled"] += 1
+            self.pool.submit(self._resolve, video_id)
+            queued += 1
+        return queued
+
+    def _resolve(self, video_id):
+        try:
+            # Load may have arrived since this was queued; real plays win
+            if self.overloaded():
+                with self.lock:
+                    self.counts["skipped_load"] += 1
+                return
+            url = yt_stream_flight.do(video_id, extract_youtube_stream_url, video_id)
+            with self.lock:
+                self.counts["resolved" if url else "failed"] += 1
+        except Exception as e:
+            logging.warning(f"Stream prefetch failed for {video_id}: {e}")
+            with self.lock:
+                self.counts["failed"] += 1
+        finally:
+            with self.lock:
+                self.pending.discard(video_id)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, pending=len(self.pending))
+
+stream_prefetcher = StreamPrefetcher()
+
+class SearchCache:
+    """LRU cache of search results with a TTL and stale-while-revalidate.
+
+    Fresh entries are returned directly. Stale entries are returned
+    immediately while one background refresh per query runs. Misses go
+    through a SingleFlight, so concurrent identical searches scrape once.
+    """
+    def __init__(self, loader, ttl=SEARCH_CACHE_TTL, stale_ttl=SEARCH_CACHE_STALE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.flight = SingleFlight()
+        self.refreshing = set()
+        self.refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='search-refresh')
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query):
+        return ' '.join(query.lower().split())
+
+    def get(self, query):
+        key = self.normalize(query)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry["stored_at"] < self.stale_ttl:
+                self.entries.move_to_end(key)
+                if now - entry["stored_at"] < self.ttl:
+                    self.hits += 1
+                    return entry["results"]
+                self.stale_hits += 1
+                if key not in self.refreshing:
+                    self.refreshing.add(key)
+                    self.refresh_pool.submit(self._refresh, key)
+                return entry["results"]
+            self.misses += 1
+        return self.flight.do(key, self._load, key)
+
+    def _load(self, key):
+        results = self.loader(key)
+        # An empty list is also what the loader returns on errors; don't pin it
+        if results:
+            with self.lock:
+                self.entries[key] = {"results": results, "stored_at": time.time()}
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return results
+
+    def _refresh(self, key):
+        try:
+            self.flight.do(key, self._load, key)
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                    "entries": len(self.entries), "refreshing": len(self.refreshing)}
+
 def search_youtube(query):
-    """Search YouTube and return 25 results"""
+    """Search YouTube and return 25 results, served from the search cache when possible"""
+    return search_cache.get(query)
+
+def scrape_youtube_search(query):
+    """Run a ytsearch25 scrape through yt-dlp"""
     try:
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'quiet': True,
-            'extract_flat': True,
-            'noplaylist': True,
-        }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with extractor_pool.acquire('search') as ydl:
             result = ydl.extract_info(f"ytsearch25:{query}", download=False)
             if 'entries' in result:
                 return [
@@ -2916,6 +3633,1381 @@ def search_youtube(query):
         logging.error(f"YT Search Error: {e}")
         return []
 
+search_cache = SearchCache(scrape_youtube_search)
+
+class SpotifyResponseCache:
+    """LRU cache of Spotify GET responses that follows Cache-Control and ETag.
+
+    Entries are keyed by token scope and path+query, so one account never
+    sees another's /me data. Fresh entries are served without a request;
+    stale entries with an ETag are revalidated with If-None-Match and a 304
+    reuses the stored body. Concurrent misses for one key share a fetch.
+    """
+    def __init__(self, max_bytes=SPOTIFY_CACHE_MAX_BYTES, max_entry_bytes=SPOTIFY_CACHE_MAX_ENTRY_BYTES,
+                 default_ttl=SPOTIFY_CACHE_DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def freshness(self, headers):
+        """Seconds a response may be served without revalidation, or None if it must not be stored"""
+        cache_control = headers.get('Cache-Control')
+        if cache_control is None:
+            return self.default_ttl
+        directives = {}
+        for part in cache_control.lower().split(','):
+            name, _, value = part.strip().partition('=')
+            directives[name] = value.strip('"')
+        if 'no-store' in directives:
+            return None
+        if 'no-cache' in directives:
+            return 0
+        try:
+            return max(int(directives.get('max-age', self.default_ttl)), 0)
+        except ValueError:
+            return 0
+
+    def get(self, path, scope):
+        """Return (status, body, cache_state) for a Spotify API path, going upstream only when needed"""
+        key = (scope, path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.time() < entry["expires_at"]:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return 200, entry["body"], "HIT"
+        return self.flight.do(key, self._fetch, key)
+
+    def _fetch(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        headers = {'If-None-Match': entry["etag"]} if entry and entry["etag"] else None
+        resp = SpotifyProxy.get(SpotifyProxy.BASE_URL + key[1], headers=headers)
+
+        if resp.status_code == 304 and entry:
+            ttl = self.freshness(resp.headers)
+            with self.lock:
+                self.revalidated += 1
+                if ttl is not None and key in self.entries:
+                    entry["expires_at"] = time.time() + ttl
+                    self.entries.move_to_end(key)
+            return 200, entry["body"], "REVALIDATED"
+
+        with self.lock:
+            self.misses += 1
+        if resp.status_code == 200:
+            self._store(key, resp)
+        return resp.status_code, resp.content, "MISS"
+
+    def _store(self, key, resp):
+        ttl = self.freshness(resp.headers)
+        etag = resp.headers.get('ETag')
+        body = resp.content
+        # A response that is stale on arrival is only worth keeping if it can be revalidated
+        if ttl is None or (ttl == 0 and not etag) or len(body) > self.max_entry_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= len(old["body"])
+            self.entries[key] = {"body": body, "etag": etag, "expires_at": time.time() + ttl}
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted["body"])
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                    "evictions": self.evictions, "entries": len(self.entries), "bytes": self.size,
+                    "coalesced": self.flight.coalesced}
+
+spotify_cache = SpotifyResponseCache()
+
+def parse_range_header(value, size):
+    """Parse a Range header into merged (start, end) pairs, inclusive.
+
+    Returns None when the header should be ignored (missing, malformed or not
+    in bytes) and an empty list when no range is satisfiable.
+    """
+    if not value:
+        return None
+    unit, _, spec = value.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        if not sep:
+            return None
+        try:
+            if first.strip():
+                start = int(first)
+                end = int(last) if last.strip() else size - 1
+                if last.strip() and end < start:
+                    return None
+            else:
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start = max(size - suffix, 0)
+                end = size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def if_range_matches(value, etag, mtime):
+    """Check an If-Range validator (ETag or HTTP-date) against the current file"""
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag
+    try:
+        return int(email.utils.parsedate_to_datetime(value).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+LIBRARY_SORT_KEYS = {
+    "title": lambda e: e["title"].lower(),
+    "artist": lambda e: (e["artist"].lower(), e["title"].lower()),
+    "duration": lambda e: e["duration"] or 0,
+    "added": lambda e: e["mtime_ns"],
+}
+
+def read_library_entry(path, filename):
+    """Parse the tags /api/library needs from one MP3"""
+    try:
+        audio = MP3(path)
+        title = str(audio.get('TIT2', [filename.replace('.mp3', '')])[0])
+        artist = str(audio.get('TPE1', ['Unknown'])[0])
+        return {"title": title, "artist": artist, "path": path, "duration": audio.info.length}
+    except Exception as e:
+        logging.warning(f"Failed to read metadata from {filename}: {e}")
+        return {"title": filename.replace('.mp3', ''), "artist": "Unknown", "path": path, "duration": 0}
+
+class LibraryIndex:
+    """Catalog of DOWNLOAD_DIR kept in memory and in SQLite, keyed by (path, size, mtime).
+
+    A refresh only stats the directory; mutagen runs only for new or changed files.
+    Once start_watching() has run, filesystem events are applied one file at a
+    time and queries never touch the directory. Each change is also pushed to
+    subscribe()d queues for /api/library/events.
+    """
+    def __init__(self, directory, db_path, rescan_interval=LIBRARY_RESCAN_INTERVAL):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.scan_lock = threading.Lock()
+        self.dir_mtime = None
+        self.last_scan = 0
+        self.watcher = None
+        self.version = 0
+        self.subscribers = set()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS library ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, title TEXT, artist TEXT, duration REAL)'
+        )
+        self.conn.commit()
+        for path, size, mtime_ns, title, artist, duration in self.conn.execute('SELECT * FROM library'):
+            self.entries[path] = {"title": title, "artist": artist, "path": path, "duration": duration,
+                                  "size": size, "mtime_ns": mtime_ns}
+
+    def invalidate(self, path=None):
+        """Force the next refresh to re-stat the directory (and re-read path, if given)"""
+        if self.watcher:
+            # Nothing polls while watching; the watcher will report the same
+            # change too, but the size/mtime check makes that a no-op.
+            self.apply('modified' if path else 'rescan', path or self.directory)
+            return
+        with self.lock:
+            if path:
+                self.entries.pop(path, None)
+            self.dir_mtime = None
+
+    def refresh(self, force=False):
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError as e:
+            logging.error(f"Library scan error: {e}")
+            return
+        if not force and dir_mtime == self.dir_mtime and time.time() - self.last_scan < self.rescan_interval:
+            return
+
+        with self.scan_lock:
+            with self.lock:
+                known = dict(self.entries)
+            seen = set()
+            changed = []
+            try:
+                with os.scandir(self.directory) as it:
+                    for dirent in it:
+                        if not dirent.name.endswith('.mp3') or not dirent.is_file():
+                            continue
+                        path = os.path.join(self.directory, dirent.name)
+                        st = dirent.stat()
+                        seen.add(path)
+                        old = known.get(path)
+                        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                            continue
+                        entry = read_library_entry(path, dirent.name)
+                        entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                        changed.append(entry)
+            except OSError as e:
+                logging.error(f"Library scan error: {e}")
+                return
+            removed = [path for path in known if path not in seen]
+
+            with self.lock:
+                for entry in changed:
+                    self.entries[entry["path"]] = entry
+                for path in removed:
+                    self.entries.pop(path, None)
+                self.dir_mtime = dir_mtime
+                self.last_scan = time.time()
+
+            if changed or removed:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO library VALUES (?, ?, ?, ?, ?, ?)',
+                    [(e["path"], e["size"], e["mtime_ns"], e["title"], e["artist"], e["duration"]) for e in changed]
+                )
+                self.conn.executemany('DELETE FROM library WHERE path = ?', [(p,) for p in removed])
+                self.conn.commit()
+                logging.info(f"Library index: {len(changed)} updated, {len(removed)} removed")
+                self.publish({"type": "rescan", "path": self.directory})
+
+    def apply(self, kind, path, dest=None):
+        """Apply one DirectoryWatcher event without listing the directory"""
+        if kind == 'rescan':
+            self.refresh(force=True)
+            return
+        if kind == 'moved':
+            self._remove(path)
+            self.publish({"type": "deleted", "path": path})
+            path = dest
+        if not path.endswith('.mp3'):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None:
+            if self._remove(path):
+                self.publish({"type": "deleted", "path": path})
+            return
+
+        with self.lock:
+            old = self.entries.get(path)
+        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            return
+        entry = read_library_entry(path, os.path.basename(path))
+        entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+        with self.scan_lock:
+            with self.lock:
+                self.entries[path] = entry
+            self.conn.execute('INSERT OR REPLACE INTO library VALUES (?, ?, ?, ?, ?, ?)',
+                              (path, entry["size"], entry["mtime_ns"], entry["title"], entry["artist"], entry["duration"]))
+            self.conn.commit()
+        self.publish({"type": "modified" if old else "created", "path": path,
+                      "entry": {k: entry[k] for k in ("title", "artist", "path", "duration")}})
+
+    def _remove(self, path):
+        with self.scan_lock:
+            with self.lock:
+                removed = self.entries.pop(path, None) is not None
+            if removed:
+                self.conn.execute('DELETE FROM library WHERE path = ?', (path,))
+                self.conn.commit()
+        return removed
+
+    def start_watching(self):
+        """Index the directory once, then follow it through filesystem events"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.refresh(force=True)
+        self.watcher = DirectoryWatcher(self.directory, self.apply, suffixes=('.mp3',))
+        backend = self.watcher.start()
+        logging.info(f"Library index watching {self.directory} ({backend})")
+
+    def subscribe(self, events=None):
+        """Register a queue for change events; None once LIBRARY_EVENTS_MAX_SUBSCRIBERS are open"""
+        events = events if events is not None else queue.Queue(maxsize=LIBRARY_EVENT_QUEUE)
+        with self.lock:
+            if len(self.subscribers) >= LIBRARY_EVENTS_MAX_SUBSCRIBERS:
+                return None
+            self.subscribers.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.discard(events)
+
+    def publish(self, event):
+        with self.lock:
+            self.version += 1
+            event["version"] = self.version
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                # A slow client: drop its backlog and tell it to reload everything
+                while not events.empty():
+                    try:
+                        events.get_nowait()
+                    except queue.Empty:
+                        break
+                events.put_nowait({"type": "rescan", "path": self.directory, "version": event["version"]})
+
+    def stats(self):
+        with self.lock:
+            stats = {"entries": len(self.entries), "version": self.version, "subscribers": len(self.subscribers)}
+        if self.watcher:
+            stats["watcher"] = self.watcher.stats()
+        return stats
+
+    def query(self, sort=None, descending=False, offset=0, limit=None):
+        """Return (page, total) of library entries in the /api/library format"""
+        if not self.watcher:
+            self.refresh()
+        with self.lock:
+            entries = list(self.entries.values())
+        if sort in LIBRARY_SORT_KEYS:
+            entries.sort(key=LIBRARY_SORT_KEYS[sort], reverse=descending)
+        total = len(entries)
+        page = entries[offset:offset + limit] if limit is not None else entries[offset:]
+        return [{k: e[k] for k in ("title", "artist", "path", "duration")} for e in page], total
+
+library_index = LibraryIndex(DOWNLOAD_DIR, LIBRARY_INDEX_DB)
+
+def library_event_message(event):
+    """Format a library change (or None for a heartbeat) as a server-sent event"""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def library_events_hello():
+    return f"retry: 3000\nevent: hello\ndata: {json.dumps({'version': library_index.version})}\n\n"
+
+def read_embedded_cover(path):
+    """Return (data, mime) of the first APIC frame in an MP3, or None"""
+    audio = MP3(path)
+    apic_key = None
+    if 'APIC:' in audio:
+        apic_key = 'APIC:'
+    else:
+        for key in audio.keys():
+            if key.startswith('APIC'):
+                apic_key = key
+                break
+    if not apic_key:
+        return None
+    apic = audio[apic_key]
+    return apic.data, apic.mime
+
+def resize_cover(data, max_size):
+    """Downscale cover art to a JPEG thumbnail; returns None without Pillow"""
+    if Image is None:
+        return None
+    image = Image.open(io.BytesIO(data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((max_size, max_size))
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=85)
+    return out.getvalue()
+
+class CoverCache:
+    """Content-addressed cache of embedded cover art and its resized variants.
+
+    Keys derive from (path, mtime, size), so editing a file's tags yields a new
+    key. Variants live on disk under COVER_CACHE_DIR with a byte-bounded LRU
+    in memory in front of them; the directory itself is capped at disk_bytes,
+    evicting every variant of the least recently used key together.
+    """
+    def __init__(self, cache_dir, memory_bytes=COVER_MEMORY_BYTES, disk_bytes=COVER_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.disk_bytes = disk_bytes
+        self.disk = OrderedDict()       # key -> bytes on disk for all its variants, oldest first
+        self.disk_used = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the disk LRU from cover_cache/, oldest file first"""
+        found = {}
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if name.endswith('.tmp'):
+                    os.remove(path)  # left behind by an interrupted write
+                    continue
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = name.split('-', 1)[0].split('.', 1)[0]
+            mtime, size = found.get(key, (0, 0))
+            found[key] = (max(mtime, st.st_mtime), size + st.st_size)
+        for key, (_, size) in sorted(found.items(), key=lambda item: item[1][0]):
+            self.disk[key] = size
+            self.disk_used += size
+
+    @staticmethod
+    def key_for(path, st):
+        return hashlib.sha1(f"{path}:{st.st_mtime_ns}:{st.st_size}".encode('utf-8')).hexdigest()[:24]
+
+    def _disk_path(self, key, variant, mime):
+        ext = 'png' if mime == 'image/png' else 'jpg'
+        return os.path.join(self.cache_dir, f"{key}-{variant}.{ext}")
+
+    def _remember(self, name, value):
+        with self.lock:
+            if name in self.memory:
+                return
+            self.memory[name] = value
+            self.memory_used += len(value[0])
+            while self.memory_used > self.memory_bytes and self.memory:
+                _, (data, _) = self.memory.popitem(last=False)
+                self.memory_used -= len(data)
+
+    def _from_disk(self, key, variant):
+        for mime in ('image/jpeg', 'image/png'):
+            disk_path = self._disk_path(key, variant, mime)
+            try:
+                with open(disk_path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            with self.lock:
+                if key in self.disk:
+                    self.disk.move_to_end(key)
+            return data, mime
+        return None
+
+    @staticmethod
+    def _write(path, data):
+        """Write via a temp file so readers never see a partially written variant"""
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _build(self, path, key):
+        """Extract the cover once and write every variant to disk"""
+        cover = read_embedded_cover(path)
+        written = 0
+        if cover is None:
+            self._write(os.path.join(self.cache_dir, f"{key}.none"), b'')
+        else:
+            data, mime = cover
+            self._write(self._disk_path(key, 'full', mime), data)
+            written += len(data)
+            for variant, max_size in COVER_VARIANTS.items():
+                if max_size is None:
+                    continue
+                try:
+                    resized = resize_cover(data, max_size)
+                except Exception as e:
+                    logging.warning(f"Cover resize failed for {path}: {e}")
+                    resized = None
+                if resized:
+                    self._write(self._disk_path(key, variant, 'image/jpeg'), resized)
+                    written += len(resized)
+        self._account(key, written)
+
+    def _account(self, key, size):
+        """Record a freshly built key and prune the oldest keys past disk_bytes"""
+        evicted = []
+        with self.lock:
+            self.disk_used += size - self.disk.pop(key, 0)
+            self.disk[key] = size
+            while self.disk_used > self.disk_bytes and len(self.disk) > 1:
+                old, old_size = self.disk.popitem(last=False)
+                self.disk_used -= old_size
+                self.pruned += 1
+                evicted.append(old)
+        for old in evicted:
+            for name in [f"{old}.none"] + [f"{old}-{variant}.{ext}" for variant in COVER_VARIANTS
+                                           for ext in ('jpg', 'png')]:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def get(self, path, key, variant):
+        """Return (data, mime) for a variant, or None if the file has no cover"""
+        name = f"{key}-{variant}"
+        with self.lock:
+            if name in self.memory:
+                self.memory.move_to_end(name)
+                self.hits += 1
+                return self.memory[name]
+
+        result = self._from_disk(key, variant)
+        if result is None and not os.path.exists(os.path.join(self.cache_dir, f"{key}.none")):
+            with self.lock:
+                self.misses += 1
+            self._build(path, key)
+            result = self._from_disk(key, variant)
+        else:
+            with self.lock:
+                self.hits += 1
+
+        if result is None and variant != 'full':
+            # No Pillow, or resizing failed: fall back to the original image
+            result = self._from_disk(key, 'full')
+        if result is not None:
+            self._remember(name, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "memory_entries": len(self.memory), "memory_bytes": self.memory_used,
+                    "disk_entries": len(self.disk), "disk_bytes": self.disk_used, "pruned": self.pruned}
+
+cover_cache = CoverCache(COVER_CACHE_DIR)
+
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{6,20}$')
+
+class UpstreamExpired(Exception):
+    pass
+
+class AudioRelay:
+    """Serves YouTube audio through this server, caching it on disk in fixed-size chunks.
+
+    The browser only ever sees /api/yt-audio/<id>, so an expired or IP-bound
+    googlevideo URL is re-resolved here instead of breaking playback. Chunks
+    live under RELAY_CACHE_DIR/<id>/ next to a meta.json holding the total
+    size and content type, and are evicted least-recently-used once the cache
+    exceeds max_bytes.
+    """
+    def __init__(self, cache_dir=RELAY_CACHE_DIR, chunk_size=RELAY_CHUNK_SIZE,
+                 fetch_chunks=RELAY_FETCH_CHUNKS, max_bytes=RELAY_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.fetch_chunks = fetch_chunks
+        self.max_bytes = max_bytes
+        self.chunks = OrderedDict()     # (video_id, index) -> size, oldest first
+        self.size = 0
+        self.meta = {}
+        self.lock = threading.Lock()
+        self.pending = {}               # (video_id, index) -> {"done", "error"} while a span fetches it
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.reresolved = 0
+        # googlevideo hosts are per-stream, so the relay keeps its own streaming session
+        # instead of growing http_client's per-host sessions and metrics
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=RELAY_POOL_SIZE, pool_maxsize=RELAY_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the LRU from what is on disk, oldest access first"""
+        found = []
+        for video_id in os.listdir(self.cache_dir):
+            directory = os.path.join(self.cache_dir, video_id)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith('.bin'):
+                    st = os.stat(os.path.join(directory, name))
+                    found.append((st.st_mtime, video_id, int(name[:-4]), st.st_size))
+        for _, video_id, index, size in sorted(found):
+            self.chunks[(video_id, index)] = size
+            self.size += size
+
+    def _chunk_path(self, video_id, index):
+        return os.path.join(self.cache_dir, video_id, f"{index}.bin")
+
+    def _read_chunk(self, video_id, index):
+        with self.lock:
+            if (video_id, index) not in self.chunks:
+                return None
+            self.chunks.move_to_end((video_id, index))
+        try:
+            with open(self._chunk_path(video_id, index), 'rb') as f:
+                return f.read()
+        except OSError:
+            with self.lock:
+                self.size -= self.chunks.pop((video_id, index), 0)
+            return None
+
+    def _store_chunk(self, video_id, index, data):
+        path = self._chunk_path(video_id, index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        evicted = []
+        with self.lock:
+            self.size += len(data) - self.chunks.pop((video_id, index), 0)
+            self.chunks[(video_id, index)] = len(data)
+            while self.size > self.max_bytes and len(self.chunks) > 1:
+                key, size = self.chunks.popitem(last=False)
+                self.size -= size
+                evicted.append(key)
+            # Videos with no chunks left lose their meta too
+            emptied = {key[0] for key in evicted} - {key[0] for key in self.chunks}
+            for gone in emptied:
+                self.meta.pop(gone, None)
+        for key in evicted:
+            if key[0] in emptied:
+                continue
+            try:
+                os.remove(self._chunk_path(*key))
+            except OSError:
+                pass
+        for gone in emptied:
+            shutil.rmtree(os.path.join(self.cache_dir, gone), ignore_errors=True)
+
+    def _fetch(self, video_id, start, end):
+        """GET bytes start..end (inclusive) upstream, re-resolving the stream URL once if it went stale"""
+        for attempt in range(2):
+            url = get_youtube_stream_url(video_id)
+            if not url:
+                raise UpstreamExpired(f"no stream for {video_id}")
+            resp = self.session.get(url, headers={'Range': f'bytes={start}-{end}'}, timeout=15, stream=True)
+            if resp.status_code in (200, 206):
+                return resp
+            resp.close()
+            if resp.status_code in (403, 404, 410) and attempt == 0:
+                # Expired or bound to another IP: drop it and extract a fresh one
+                logging.info(f"Stream URL for {video_id} rejected ({resp.status_code}), re-resolving")
+                stream_cache.invalidate(video_id)
+                with self.lock:
+                    self.reresolved += 1
+                continue
+            raise UpstreamExpired(f"upstream returned {resp.status_code} for {video_id}")
+
+    def _save_meta(self, video_id, meta):
+        path = os.path.join(self.cache_dir, video_id, 'meta.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(meta, f)
+
+    def info(self, video_id):
+        """Return {"size", "mime"} for a video, fetching its first chunks if unknown"""
+        with self.lock:
+            meta = self.meta.get(video_id)
+        if meta:
+            return meta
+        try:
+            with open(os.path.join(self.cache_dir, video_id, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            meta = {"size": int(meta["size"]), "mime": str(meta["mime"])}
+        except (OSError, ValueError, KeyError, TypeError):
+            # No usable meta: chunks left on disk cannot be trusted, so treat it all as a miss
+            self.purge(video_id)
+            self.chunk(video_id, 0)
+            with self.lock:
+                meta = self.meta.get(video_id)
+            if meta is None:
+                raise UpstreamExpired(f"no stream metadata for {video_id}")
+            return meta
+        with self.lock:
+            meta = self.meta.setdefault(video_id, meta)
+        return meta
+
+    def _claim(self, video_id, first):
+        """Register up to fetch_chunks missing chunks from first on as in flight; call with self.lock held"""
+        meta = self.meta.get(video_id)
+        last = first + self.fetch_chunks - 1
+        if meta:
+            last = min(last, (meta["size"] - 1) // self.chunk_size)
+        claimed = [first]
+        for index in range(first + 1, last + 1):
+            if (video_id, index) in self.chunks or (video_id, index) in self.pending:
+                break
+            claimed.append(index)
+        for index in claimed:
+            self.pending[(video_id, index)] = {"done": threading.Event(), "error": None}
+        return claimed
+
+    def _release(self, video_id, index, error=None):
+        with self.lock:
+            call = self.pending.pop((video_id, index), None)
+        if call:
+            call["error"] = error
+            call["done"].set()
+
+    def _load_span(self, video_id, claimed):
+        """Fetch the claimed chunks with one ranged request, caching each as soon as it is complete"""
+        first, last = claimed[0], claimed[-1]
+        with self.lock:
+            self.misses += 1
+        error = None
+        try:
+            resp = self._fetch(video_id, first * self.chunk_size, (last + 1) * self.chunk_size - 1)
+            with resp:
+                total = resp.headers.get('Content-Range', '').rpartition('/')[2]
+                length = resp.headers.get('Content-Length')
+                if not total.isdigit() and not (resp.status_code == 200 and length):
+                    raise UpstreamExpired(f"upstream sent no size for {video_id}")
+                size = int(total) if total.isdigit() else int(length)
+                mime = resp.headers.get('Content-Type', 'audio/webm').split(';')[0]
+                with self.lock:
+                    meta = self.meta.get(video_id)
+                    created = meta is None
+                    if created:
+                        meta = self.meta[video_id] = {"size": size, "mime": mime}
+                if created:
+                    self._save_meta(video_id, meta)
+                if size != meta["size"]:
+                    # A re-resolved URL picked a different format; cached chunks no longer line up
+                    self.purge(video_id)
+                    raise UpstreamExpired(f"stream for {video_id} changed size")
+
+                # A 200 means upstream ignored the Range header: skip to the span and stop after it
+                skip = first * self.chunk_size if resp.status_code == 200 else 0
+                remaining = len(claimed) * self.chunk_size
+                buf = bytearray()
+                index = first
+                result = None
+                for piece in resp.iter_content(RELAY_READ_SIZE):
+                    if skip:
+                        dropped = min(skip, len(piece))
+                        piece = piece[dropped:]
+                        skip -= dropped
+                    piece = piece[:remaining]
+                    remaining -= len(piece)
+                    buf += piece
+                    while len(buf) >= self.chunk_size:
+                        data = bytes(buf[:self.chunk_size])
+                        del buf[:self.chunk_size]
+                        self._store_chunk(video_id, index, data)
+                        self._release(video_id, index)
+                        result = data if result is None else result
+                        index += 1
+                    if remaining <= 0:
+                        break
+                if buf:
+                    # Last chunk of the file
+                    self._store_chunk(video_id, index, bytes(buf))
+                    self._release(video_id, index)
+                    result = bytes(buf) if result is None else result
+            if result is None:
+                raise UpstreamExpired(f"upstream sent no data for {video_id} chunk {first}")
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            for index in claimed:
+                self._release(video_id, index, error)
+
+    def purge(self, video_id):
+        with self.lock:
+            self.meta.pop(video_id, None)
+            for key in [k for k in self.chunks if k[0] == video_id]:
+                self.size -= self.chunks.pop(key)
+        shutil.rmtree(os.path.join(self.cache_dir, video_id), ignore_errors=True)
+
+    def chunk(self, video_id, index):
+        """Return one chunk, joining an in-flight span fetch that covers it instead of fetching twice"""
+        while True:
+            data = self._read_chunk(video_id, index)
+            if data is not None:
+                with self.lock:
+                    self.hits += 1
+                return data
+            with self.lock:
+                call = self.pending.get((video_id, index))
+                if call is None:
+                    claimed = self._claim(video_id, index)
+                else:
+                    self.coalesced += 1
+            if call is None:
+                return self._load_span(video_id, claimed)
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+
+    def iter_range(self, video_id, start, end):
+        """Yield the bytes start..end (inclusive) of a video, chunk by chunk"""
+        for index in range(start // self.chunk_size, end // self.chunk_size + 1):
+            data = self.chunk(video_id, index)
+            base = index * self.chunk_size
+            yield data[max(start - base, 0):end - base + 1]
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                    "reresolved": self.reresolved,
+                    "chunks": len(self.chunks), "bytes": self.size}
+
+audio_relay = AudioRelay()
+
+class DownloadCancelled(Exception):
+    pass
+
+class DownloadManager:
+    """Bounded download queue with per-file dedupe, priorities, progress and cancellation.
+
+    Jobs are plain dicts so they can be sent as JSON directly. Queued and
+    running jobs are persisted to DOWNLOAD_QUEUE_FILE and resumed on start.
+    """
+    ACTIVE = ('queued', 'downloading', 'processing')
+
+    def __init__(self, workers=DOWNLOAD_WORKERS, state_file=DOWNLOAD_QUEUE_FILE):
+        self.state_file = state_file
+        self.jobs = OrderedDict()
+        self.by_file = {}
+        self.queue = queue.PriorityQueue()
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.cover_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download-cover')
+        self.modes = {"pipelined": 0, "classic": 0, "fallbacks": 0}
+
+        self._load()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"download-{i}", daemon=True).start()
+
+    def _load(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                saved = json.load(f)
+        except Exception as e:
+            logging.error(f"Could not load download queue: {e}")
+            return
+        for job in saved:
+            job.update(status='queued', progress=0.0, downloaded_bytes=0, total_bytes=None,
+                       speed=None, eta=None, error=None)
+            self._enqueue(job)
+        if saved:
+            logging.info(f"Resumed {len(saved)} queued downloads")
+
+    def _persist(self):
+        """Write active jobs atomically; caller holds self.lock"""
+        active = [
+            {k: job[k] for k in ('id', 'title', 'artist', 'image_url', 'youtube_id', 'filepath', 'priority', 'created_at')}
+            for job in self.jobs.values() if job['status'] in self.ACTIVE
+        ]
+        tmp = self.state_file + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(active, f)
+            os.replace(tmp, self.state_file)
+        except Exception as e:
+            logging.error(f"Could not save download queue: {e}")
+
+    def _enqueue(self, job):
+        self.jobs[job['id']] = job
+        self.by_file[job['filepath']] = job['id']
+        # Higher priority first, FIFO within a priority
+        self.queue.put((-job['priority'], next(self.seq), job['id']))
+
+    def submit(self, title, artist, image_url=None, youtube_id=None, priority=0):
+        """Queue a download; returns (job, created). An active job for the same file is reused."""
+        filepath = os.path.join(DOWNLOAD_DIR, f"{artist} - {title}.mp3")
+        with self.lock:
+            existing = self.by_file.get(filepath)
+            if existing:
+                return self.jobs[existing], False
+            job = {
+                "id": uuid.uuid4().hex[:12],
+                "title": title,
+                "artist": artist,
+                "image_url": image_url,
+                "youtube_id": youtube_id,
+                "filepath": filepath,
+                "priority": priority,
+                "status": "queued",
+                "progress": 0.0,
+                "downloaded_bytes": 0,
+                "total_bytes": None,
+                "speed": None,
+                "eta": None,
+                "error": None,
+                "created_at": time.time(),
+            }
+            self._enqueue(job)
+            self._trim_history()
+            self._persist()
+        return job, True
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if not job or job['status'] not in self.ACTIVE:
+                return False
+            job['cancel_requested'] = True
+            if job['status'] == 'queued':
+                self._finish(job, 'cancelled')
+        return True
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            counts['modes'] = dict(self.modes)
+            return counts
+
+    def _finish(self, job, status, error=None):
+        """Caller holds self.lock"""
+        job['status'] = status
+        job['error'] = error
+        if self.by_file.get(job['filepath']) == job['id']:
+            del self.by_file[job['filepath']]
+        self._persist()
+
+    def _trim_history(self):
+        finished = [jid for jid, job in self.jobs.items() if job['status'] not in self.ACTIVE]
+        for jid in finished[:max(len(finished) - DOWNLOAD_HISTORY_LIMIT, 0)]:
+            del self.jobs[jid]
+
+    def _worker(self):
+        while True:
+            _, _, job_id = self.queue.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if not job or job['status'] != 'queued':
+                    continue
+                job['status'] = 'downloading'
+            try:
+                self._run(job)
+                with self.lock:
+                    self._finish(job, 'done')
+                    job['progress'] = 1.0
+            except Exception as e:
+                with self.lock:
+                    if job.get('cancel_requested'):
+                        self._finish(job, 'cancelled')
+                    else:
+                        logging.error(f"Download failed: {e}")
+                        self._finish(job, 'failed', str(e))
+                self._remove_partials(job['filepath'])
+
+    @staticmethod
+    def _remove_partials(filepath):
+        """Delete this job's intermediate files, matching its output template exactly.
+
+        Another job's "<artist> - <title> (Live).mp3.part" shares our prefix,
+        so only names derived from our own stem are removed.
+        """
+        base = filepath[:-len('.mp3')]
+        directory = os.path.dirname(base)
+        stem = os.path.basename(base)
+        # Pipelined ffmpeg writes <stem>.mp3.part; yt-dlp writes <stem>, <stem>.part, <stem>.ytdl, fragments
+        exact = {stem, f"{stem}.part", f"{stem}.ytdl", f"{stem}.mp3.part"}
+        for name in os.listdir(directory):
+            if name in exact or name.startswith(f"{stem}.part-Frag"):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def _progress_hook(self, job):
+        def hook(d):
+            if job.get('cancel_requested'):
+                raise DownloadCancelled(job['id'])
+            if d.get('status') == 'downloading':
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                job.update(
+                    downloaded_bytes=d.get('downloaded_bytes', 0),
+                    total_bytes=total,
+                    speed=d.get('speed'),
+                    eta=d.get('eta'),
+                    progress=(d.get('downloaded_bytes', 0) / total) if total else job['progress'],
+                )
+            elif d.get('status') == 'finished':
+                job.update(status='processing', progress=1.0)
+        return hook
+
+    @staticmethod
+    def _source_url(job):
+        if job['youtube_id']:
+            return f"https://www.youtube.com/watch?v={job['youtube_id']}"
+        return f"ytsearch:{job['title']} {job['artist']} official audio"
+
+    def _run(self, job):
+        if DOWNLOAD_PIPELINE and FFMPEG_BIN:
+            try:
+                self._run_pipelined(job)
+                self._count('pipelined')
+                return
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                if job.get('cancel_requested'):
+                    raise DownloadCancelled(job['id'])
+                logging.warning(f"Pipelined download failed for {job['title']}, using yt-dlp: {e}")
+                self._count('fallbacks')
+                self._remove_partials(job['filepath'])
+                job.update(status='downloading', progress=0.0)
+        self._run_classic(job)
+        self._count('classic')
+
+    def _count(self, mode):
+        with self.lock:
+            self.modes[mode] += 1
+
+    def _run_pipelined(self, job):
+        """Resolve the audio URL, then let a single ffmpeg fetch, encode and tag it.
+
+        The cover is downloaded while the URL is resolved and handed to ffmpeg
+        on stdin, so the MP3 is written once, already tagged, and never
+        reopened.
+        """
+        cover_future = self.cover_pool.submit(fetch_cover_art, job['image_url']) if job['image_url'] else None
+
+        info = extractor_pool.extract_info('extract', self._source_url(job))
+        if info and info.get('entries') is not None:
+            info = next((e for e in info['entries'] if e), None)
+        if not info or not info.get('url'):
+            raise RuntimeError("no direct audio URL")
+        if job.get('cancel_requested'):
+            raise DownloadCancelled(job['id'])
+
+        cover = None
+        if cover_future is not None:
+            try:
+                cover = cover_future.result(timeout=COVER_FETCH_TIMEOUT)
+            except Exception:
+                cover = None
+
+        partial = job['filepath'] + '.part'
+        cmd = [FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-y']
+        http_headers = info.get('http_headers') or {}
+        if info['url'].startswith('http'):
+            cmd += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+            if http_headers:
+                cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in http_headers.items())]
+        cmd += ['-i', info['url']]
+        if cover:
+            cmd += ['-i', 'pipe:0', '-map', '0:a:0', '-map', '1:v:0', '-c:v', 'copy',
+                    '-disposition:v', 'attached_pic',
+                    '-metadata:s:v', 'title=Album cover', '-metadata:s:v', 'comment=Cover (front)']
+        else:
+            cmd += ['-map', '0:a:0']
+        cmd += [
+            '-c:a', 'libmp3lame', '-b:a', DOWNLOAD_BITRATE, '-id3v2_version', '3',
+            '-metadata', f"title={job['title']}",
+            '-metadata', f"artist={job['artist']}",
+            '-metadata', "album=Downloaded",
+            '-metadata', "genre=Spotify Downloader",
+            '-progress', 'pipe:1', '-nostats',
+            '-f', 'mp3', partial,
+        ]
+
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if cover else subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if cover:
+            threading.Thread(target=self._feed_stdin, args=(proc, cover), daemon=True).start()
+        stderr_lines = []
+        stderr_reader = threading.Thread(target=lambda: stderr_lines.extend(proc.stderr), daemon=True)
+        stderr_reader.start()
+
+        try:
+            self._track_ffmpeg_progress(job, proc, info.get('duration'))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            stderr_reader.join(timeout=1)
+
+        if job.get('cancel_requested'):
+            raise DownloadCancelled(job['id'])
+        if proc.returncode != 0:
+            detail = b''.join(stderr_lines[-3:]).decode('utf-8', 'replace').strip()
+            raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {detail}")
+        os.replace(partial, job['filepath'])
+        library_index.invalidate(job['filepath'])
+
+    @staticmethod
+    def _feed_stdin(proc, data):
+        try:
+            proc.stdin.write(data)
+            proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def _track_ffmpeg_progress(self, job, proc, duration):
+        """Read ffmpeg -progress key=value lines into the job until it exits"""
+        state = {}
+        for raw in proc.stdout:
+            if job.get('cancel_requested'):
+                proc.kill()
+                raise DownloadCancelled(job['id'])
+            key, _, value = raw.decode('ascii', 'replace').strip().partition('=')
+            state[key] = value
+            if key != 'progress':
+                continue
+            update = {}
+            try:
+                done = int(state.get('out_time_us') or 0) / 1e6
+                update["downloaded_bytes"] = int(state.get('total_size') or 0)
+            except ValueError:
+                done = 0
+            try:
+                speed = float(state.get('speed', '').rstrip('x'))
+            except ValueError:
+                speed = 0      # "N/A" until ffmpeg has decoded enough
+            if duration:
+                update["progress"] = min(done / duration, 1.0)
+                update["eta"] = (duration - done) / speed if speed else None
+            if value == 'end':
+                update.update(status='processing', progress=1.0, eta=0)
+            job.update(update)
+
+    def _run_classic(self, job):
+        """yt-dlp download followed by FFmpegExtractAudio and mutagen tagging"""
+        title, artist, filepath = job['title'], job['artist'], job['filepath']
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+            'outtmpl': filepath.replace('.mp3', ''),
+            'quiet': True,
+            'no_warnings': True,
+            'progress_hooks': [self._progress_hook(job)],
+            # The same hook lets a cancel stop the job before FFmpeg starts converting
+            'postprocessor_hooks': [self._progress_hook(job)],
+        }
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.extract_info(self._source_url(job), download=True)
+
+        if job.get('cancel_requested'):
+            # Cancelled while FFmpeg was converting: a cancelled job must not leave its MP3 behind
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+            raise DownloadCancelled(job['id'])
+        set_metadata(filepath, title, artist, "", job['image_url'])
+        library_index.invalidate(filepath)
+
+download_manager = DownloadManager()
+
+class StaticAsset:
+    """Frontend resource encoded and compressed once at startup"""
+    def __init__(self, body, mime, cache_control):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mime = mime
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = {'identity': body, 'gzip': gzip.compress(body, 9)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding):
+        # Strong ETags must differ between representations
+        return f'"{self.digest}"' if encoding == 'identity' else f'"{self.digest}-{encoding}"'
+
+    def negotiate(self, accept_encoding):
+        """Pick the best available encoding for an Accept-Encoding header"""
+        weights = {}
+        for item in (accept_encoding or '').split(','):
+            name, _, params = item.strip().partition(';')
+            name = name.strip().lower()
+            if not name:
+                continue
+            q = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            weights[name] = q
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and weights.get(encoding, weights.get('*', 0)) > 0:
+                return encoding
+        return 'identity'
+
+def build_frontend(html):
+    """Split the inline <style> and <script> out of the page into content-hashed assets.
+
+    Returns a dict of request path -> StaticAsset, with the page itself at "/".
+    """
+    assets = {}
+    immutable = f'public, max-age={ASSET_MAX_AGE}, immutable'
+
+    def extract(match, ext, mime, tag):
+        asset = StaticAsset(match.group(1), mime, immutable)
+        path = f"/assets/app.{asset.digest[:12]}.{ext}"
+        assets[path] = asset
+        return tag.format(path=path)
+
+    html = re.sub(r'<style>(.*?)</style>',
+                  lambda m: extract(m, 'css', 'text/css; charset=utf-8', '<link rel="stylesheet" href="{path}">'),
+                  html, count=1, flags=re.S)
+    html = re.sub(r'<script>(.*?)</script>',
+                  lambda m: extract(m, 'js', 'application/javascript; charset=utf-8', '<script src="{path}"></script>'),
+                  html, count=1, flags=re.S)
+    assets['/'] = StaticAsset(html, 'text/html; charset=utf-8', 'no-cache')
+    return assets
+
+frontend_assets = build_frontend(HTML_CONTENT)
+
+class PoolSaturated(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class RoutePool:
+    """Concurrency limit for one class of blocking routes.
+
+    At most `workers` requests of the class run at once, on the thread that
+    is already serving them, and `max_queue` more may wait for a slot; beyond
+    that run() raises PoolSaturated immediately so slow routes cannot tie up
+    every server thread.
+    """
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.slots = threading.BoundedSemaphore(workers)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up"""
+        avg_run = self.run_total / self.completed if self.completed else 1.0
+        backlog = (self.pending + 1) / self.workers
+        return min(max(1, int(avg_run * backlog + 0.999)), OVERLOAD_RETRY_AFTER_MAX)
+
+    def run(self, fn, *args):
+        """Run fn once a slot is free; raises PoolSaturated when the queue is full"""
+        with self.lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(self.retry_after())
+            self.pending += 1
+        submitted = time.time()
+        self.slots.acquire()
+        started = time.time()
+        waited = started - submitted
+        with self.lock:
+            self.active += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        try:
+            return fn(*args)
+        finally:
+            self.slots.release()
+            with self.lock:
+                self.active -= 1
+                self.pending -= 1
+                self.completed += 1
+                self.run_total += time.time() - started
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "queued": self.pending - self.active,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_avg_ms": round(self.wait_total / self.completed * 1000, 1) if self.completed else 0,
+                "wait_max_ms": round(self.wait_max * 1000, 1),
+                "run_avg_ms": round(self.run_total / self.completed * 1000, 1) if self.completed else 0,
+            }
+
+route_pools = {name: RoutePool(name, workers, max_queue) for name, (workers, max_queue) in ROUTE_POOLS.items()}
+
+def route_class(method, path):
+    """Pool name for a request, or None for cheap routes that run inline"""
+    if method == 'GET':
+        if path.startswith(('/api/yt-stream', '/api/search-yt')):
+            return "extraction"
+        if path.startswith('/api/cover') or path == '/api/library' or path.startswith('/api/library?'):
+            return "metadata"
+        if path.startswith(('/api/spotify', '/callback')):
+            return "proxy"
+        if path.startswith('/api/yt-audio/'):
+            return "relay"
+        if path == '/api/library/events':
+            return "events"
+    return None
+
+def collect_metrics():
+    """Snapshot of cache and concurrency counters for /api/metrics"""
+    return {
+        "spotify_auth": token_manager.stats(),
+        "spotify_cache": spotify_cache.stats(),
+        "stream_cache": stream_cache.stats(),
+        "yt_stream": yt_stream_stats(),
+        "search_cache": search_cache.stats(),
+        "stream_prefetch": stream_prefetcher.stats(),
+        "extractors": extractor_pool.stats(),
+        "library": library_index.stats(),
+        "covers": cover_cache.stats(),
+        "audio_relay": audio_relay.stats(),
+        "downloads": download_manager.stats(),
+        "outbound_http": http_client.metrics(),
+        "route_pools": {name: pool.stats() for name, pool in route_pools.items()},
+    }
+
 class RequestHandler(SimpleHTTPRequestHandler):
     def log_message(self, format, *args):
         """Suppress default logging"""
@@ -2927,6 +5019,7 @@ class RequestHandler(SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         super().end_headers()
+        self.headers_sent = True
 
     def do_OPTIONS(self):
         self.send_response(200)
@@ -2941,37 +5034,197 @@ class RequestHandler(SimpleHTTPRequestHandler):
         except (BrokenPipeError, ConnectionResetError, OSError):
             pass
 
-    def do_GET(self):
-        if self.path == '/':
+    def send_file_range(self, path, offset, count):
+        """Send part of a file, zero-copy where the platform allows"""
+        if count <= 0:
+            return
+        try:
+            with open(path, 'rb') as f:
+                self.connection.sendfile(f, offset, count)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+
+    def serve_asset(self, asset):
+        """Send a precompressed StaticAsset, answering revalidations with 304"""
+        encoding = asset.negotiate(self.headers.get('Accept-Encoding'))
+        etag = asset.etag(encoding)
+        if_none_match = self.headers.get('If-None-Match', '')
+        if etag in [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', asset.cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = asset.encodings[encoding]
+        self.send_response(200)
+        self.send_header('Content-type', asset.mime)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', asset.cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.safe_write(body)
+
+    def serve_file(self, path, mime):
+        """Serve a file with Range, If-Range and multipart/byteranges support"""
+        st = os.stat(path)
+        size = st.st_size
+        etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+        last_modified = self.date_time_string(st.st_mtime)
+
+        ranges = None
+        if if_range_matches(self.headers.get('If-Range'), etag, st.st_mtime):
+            ranges = parse_range_header(self.headers.get('Range'), size)
+
+        if ranges == []:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if not ranges:
             self.send_response(200)
-            self.send_header('Content-type', 'text/html')
+            self.send_header('Content-type', mime)
+            self.send_header('Content-Length', str(size))
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_response(206)
+            self.send_header('Content-type', mime)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Content-Length', str(end - start + 1))
+        else:
+            boundary = uuid.uuid4().hex
+            part_heads = [
+                (f'\r\n--{boundary}\r\nContent-Type: {mime}\r\n'
+                 f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode('latin-1')
+                for start, end in ranges
+            ]
+            closing = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+            length = sum(len(h) for h in part_heads) + sum(end - start + 1 for start, end in ranges) + len(closing)
+            self.send_response(206)
+            self.send_header('Content-type', f'multipart/byteranges; boundary={boundary}')
+            self.send_header('Content-Length', str(length))
+
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+
+        if not ranges:
+            self.send_file_range(path, 0, size)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_file_range(path, start, end - start + 1)
+        else:
+            for head, (start, end) in zip(part_heads, ranges):
+                self.safe_write(head)
+                self.send_file_range(path, start, end - start + 1)
+            self.safe_write(closing)
+
+    def serve_relay(self, video_id):
+        """Relay YouTube audio through audio_relay with single-range support"""
+        try:
+            meta = audio_relay.info(video_id)
+        except Exception as e:
+            logging.error(f"Audio relay error for {video_id}: {e}")
+            self.send_error(502)
+            return
+        size = meta["size"]
+        ranges = parse_range_header(self.headers.get('Range'), size)
+        if ranges == []:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
             self.end_headers()
-            self.safe_write(HTML_CONTENT)
+            return
+
+        # Multiple ranges are rare for media elements; answer those with the whole body
+        if ranges and len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            start, end = 0, size - 1
+            self.send_response(200)
+        self.send_header('Content-type', meta["mime"])
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        try:
+            for data in audio_relay.iter_range(video_id, start, end):
+                self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            # Headers are gone already; dropping the connection tells the player to retry
+            logging.error(f"Audio relay failed mid-stream for {video_id}: {e}")
+            self.close_connection = True
+
+    def serve_library_events(self):
+        """Push library changes to the client as server-sent events"""
+        events = library_index.subscribe()
+        if events is None:
+            self.send_overloaded(LIBRARY_EVENTS_HEARTBEAT)
+            return
+        self.begin_stream('text/event-stream', headers={'Cache-Control': 'no-cache'})
+        try:
+            if not self.write_chunk(library_events_hello()):
+                return
+            deadline = time.time() + LIBRARY_EVENTS_MAX_AGE
+            while time.time() < deadline:
+                try:
+                    message = library_event_message(events.get(timeout=LIBRARY_EVENTS_HEARTBEAT))
+                except queue.Empty:
+                    message = library_event_message(None)
+                if not self.write_chunk(message):
+                    return
+            if self._chunked:
+                self.safe_write(b'0\r\n\r\n')
+        finally:
+            library_index.unsubscribe(events)
+
+    def send_overloaded(self, retry_after):
+        body = json.dumps({"success": False, "error": "Server busy", "retry_after": retry_after}).encode('utf-8')
+        self.send_response(503)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.safe_write(body)
+
+    def do_GET(self):
+        self.headers_sent = False
+        pool = route_class('GET', self.path)
+        if pool is None:
+            self.route_get()
+            return
+        try:
+            route_pools[pool].run(self.route_get)
+        except PoolSaturated as e:
+            logging.warning(f"{pool} pool saturated, rejecting {self.path}")
+            self.send_overloaded(e.retry_after)
+
+    def route_get(self):
+        if self.path == '/' or self.path.startswith('/assets/'):
+            asset = frontend_assets.get(self.path)
+            if asset:
+                self.serve_asset(asset)
+            else:
+                self.send_error(404)
         
         elif self.path.startswith('/callback'):
             query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
             code = query.get('code', [None])[0]
             if code:
                 try:
-                    auth_str = base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
-                    resp = requests.post(
-                        'https://accounts.spotify.com/api/token',
-                        data={
-                            "grant_type": "authorization_code",
-                            "code": code,
-                            "redirect_uri": REDIRECT_URI
-                        },
-                        headers={
-                            "Authorization": f"Basic {auth_str}",
-                            "Content-Type": "application/x-www-form-urlencoded"
-                        },
-                        timeout=10
-                    )
+                    resp = token_manager.exchange_code(code)
                     if resp.status_code == 200:
-                        data = resp.json()
-                        auth_state['access_token'] = data['access_token']
-                        auth_state['refresh_token'] = data.get('refresh_token')
-                        auth_state['expires_at'] = time.time() + data['expires_in']
                         logging.info("Authentication successful")
                         self.send_response(302)
                         self.send_header('Location', '/')
@@ -2992,12 +5245,16 @@ class RequestHandler(SimpleHTTPRequestHandler):
             self.send_header('Location', auth_url)
             self.end_headers()
 
+        elif self.path == '/api/metrics':
+            self.send_json(collect_metrics())
+
         elif self.path == '/api/auth/status':
-            self.send_json({"logged_in": auth_state['access_token'] is not None, "token": auth_state['access_token']})
+            # The refresh loop keeps the token current; this route must stay instant
+            self.send_json(token_manager.status())
             
         elif self.path == '/api/auth/logout':
-            auth_state['access_token'] = None
-            auth_state['refresh_token'] = None
+            token_manager.clear()
+            spotify_cache.clear()
             logging.info("User logged out")
             self.send_response(302)
             self.send_header('Location', '/')
@@ -3005,20 +5262,15 @@ class RequestHandler(SimpleHTTPRequestHandler):
 
         elif self.path.startswith('/api/spotify'):
             if '/me/tracks' in self.path:
-                url = SpotifyProxy.BASE_URL + self.path.replace('/api/spotify', '')
-                
-                parsed_url = urllib.parse.urlparse(url)
-                query_params = urllib.parse.parse_qs(parsed_url.query)
-                query_params['limit'] = ['50']
-                query_params['market'] = ['from_token'] 
-                
-                new_query = urllib.parse.urlencode(query_params, doseq=True)
-                url = urllib.parse.urlunparse((parsed_url.scheme, parsed_url.netloc, parsed_url.path, parsed_url.params, new_query, parsed_url.fragment))
+                parsed_url = urllib.parse.urlparse(SpotifyProxy.BASE_URL + self.path.replace('/api/spotify', ''))
+                url = urllib.parse.urlunparse(parsed_url._replace(query=''))
+                params = {k: v[0] for k, v in urllib.parse.parse_qs(parsed_url.query).items()}
+                ndjson = params.pop('format', None) == 'ndjson'
+                params['limit'] = str(SPOTIFY_PAGE_SIZE)
+                params['market'] = 'from_token'
 
-                all_items = []
-                
                 try:
-                    resp = requests.get(url, headers=SpotifyProxy.get_headers(), timeout=10)
+                    resp = SpotifyProxy.get(url, params=params)
                     if resp.status_code != 200:
                         logging.error(f"Spotify API Error on /me/tracks: {resp.status_code} - {resp.text}")
                         self.send_response(resp.status_code)
@@ -3027,63 +5279,62 @@ class RequestHandler(SimpleHTTPRequestHandler):
                         self.safe_write(resp.content)
                         return
 
-                    data = resp.json()
-                    all_items.extend(data.get('items', []))
-                    next_url = data.get('next')
-
-                    while next_url:
-                        time.sleep(0.1)
-                        resp = requests.get(next_url, headers=SpotifyProxy.get_headers(), timeout=10)
-                        if resp.status_code != 200:
-                            logging.warning(f"Pagination failed at {next_url}: {resp.status_code}")
-                            break
-                        data = resp.json()
-                        if 'items' in data:
-                            all_items.extend(data['items'])
-                        else:
-                            break
-                        next_url = data.get('next')
-                    
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    self.safe_write(json.dumps({"items": all_items, "total": len(all_items)}).encode('utf-8'))
-                    return
-
+                    first_page = resp.json()
                 except Exception as e:
                     logging.error(f"Exception in liked songs fetch: {e}")
                     self.send_error(500, str(e))
                     return
 
-            url = SpotifyProxy.BASE_URL + self.path.replace('/api/spotify', '')
+                def liked_items():
+                    try:
+                        for items in itertools.chain([first_page.get('items', [])], iter_spotify_pages(url, params, first_page)):
+                            yield from items or []
+                    except Exception as e:
+                        # Re-raise so the stream is cut off unterminated rather than ending as a short, valid list
+                        logging.error(f"Exception in liked songs fetch: {e}")
+                        raise
+
+                # Stream items out as pages arrive instead of buffering the whole library
+                if ndjson:
+                    self.send_ndjson(liked_items())
+                else:
+                    self.send_json_stream(json_items_object(liked_items()))
+                return
+
             try:
-                resp = requests.get(url, headers=SpotifyProxy.get_headers(), timeout=10)
-                self.send_response(resp.status_code)
+                status, body, cache_state = spotify_cache.get(self.path.replace('/api/spotify', '', 1), token_manager.scope())
+                self.send_response(status)
                 self.send_header('Content-type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-Cache', cache_state)
                 self.end_headers()
-                self.safe_write(resp.content)
+                self.safe_write(body)
             except Exception as e:
                 logging.error(f"Spotify proxy error: {e}")
                 self.send_error(502, str(e))
         
-        elif self.path == '/api/library':
-            files = []
+        elif self.path == '/api/library/events':
+            self.serve_library_events()
+
+        elif self.path == '/api/library' or self.path.startswith('/api/library?'):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
             try:
-                for f in os.listdir(DOWNLOAD_DIR):
-                    if f.endswith('.mp3'):
-                        try:
-                            path = os.path.join(DOWNLOAD_DIR, f)
-                            audio = MP3(path)
-                            title = str(audio.get('TIT2', [f.replace('.mp3', '')])[0])
-                            artist = str(audio.get('TPE1', ['Unknown'])[0])
-                            duration = audio.info.length
-                            files.append({"title": title, "artist": artist, "path": path, "duration": duration})
-                        except Exception as e:
-                            logging.warning(f"Failed to read metadata from {f}: {e}")
-                            files.append({"title": f.replace('.mp3', ''), "artist": "Unknown", "path": os.path.join(DOWNLOAD_DIR, f), "duration": 0})
-            except Exception as e:
-                logging.error(f"Library scan error: {e}")
-            self.send_json(files)
+                offset = max(int(query.get('offset', ['0'])[0]), 0)
+                limit = query.get('limit', [None])[0]
+                limit = max(int(limit), 0) if limit is not None else None
+            except ValueError:
+                self.send_error(400)
+                return
+            files, total = library_index.query(
+                sort=query.get('sort', [None])[0],
+                descending=query.get('order', ['asc'])[0] == 'desc',
+                offset=offset,
+                limit=limit
+            )
+            if query.get('format', [None])[0] == 'ndjson':
+                self.send_ndjson(files, headers={'X-Total-Count': str(total)})
+            else:
+                self.send_json(files, headers={'X-Total-Count': str(total)})
 
         elif self.path.startswith('/api/files'):
             query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
@@ -3099,22 +5350,18 @@ class RequestHandler(SimpleHTTPRequestHandler):
             
             if os.path.exists(real_path) and real_path.startswith(real_download):
                 try:
-                    self.send_response(200)
                     if path.lower().endswith('.mp3'):
                         mime = 'audio/mpeg'
                     else:
                         mime = mimetypes.guess_type(path)[0] or 'audio/mpeg'
-                    
-                    self.send_header('Content-type', mime)
-                    self.send_header('Accept-Ranges', 'bytes')
-                    file_size = os.path.getsize(path)
-                    self.send_header('Content-Length', str(file_size))
-                    self.end_headers()
-                    with open(path, 'rb') as f:
-                        self.safe_write(f.read())
+                    self.serve_file(real_path, mime)
                 except Exception as e:
                     logging.error(f"File serve error: {e}")
-                    self.send_error(500)
+                    if self.headers_sent:
+                        # The status line is already out; all we can do is cut the response short
+                        self.close_connection = True
+                    else:
+                        self.send_error(500)
             else:
                 self.send_error(404)
 
@@ -3130,26 +5377,46 @@ class RequestHandler(SimpleHTTPRequestHandler):
             real_path = os.path.realpath(path)
             real_download = os.path.realpath(DOWNLOAD_DIR)
             
+            variant = query.get('size', ['full'])[0]
+            if variant not in COVER_VARIANTS:
+                self.send_error(400)
+                return
+
             if os.path.exists(real_path) and real_path.startswith(real_download):
                 try:
-                    audio = MP3(path)
-                    apic_key = None
-                    if 'APIC:' in audio:
-                        apic_key = 'APIC:'
-                    else:
-                        for key in audio.keys():
-                            if key.startswith('APIC'):
-                                apic_key = key
-                                break
-                    
-                    if apic_key:
-                        apic = audio[apic_key]
-                        img_data = apic.data
-                        img_mime = apic.mime 
-                        
+                    st = os.stat(real_path)
+                    key = CoverCache.key_for(real_path, st)
+                    etag = f'"{key}-{variant}"'
+                    cache_headers = {
+                        'ETag': etag,
+                        'Last-Modified': self.date_time_string(st.st_mtime),
+                        'Cache-Control': f'public, max-age={COVER_MAX_AGE}',
+                    }
+
+                    not_modified = self.headers.get('If-None-Match') == etag
+                    if not not_modified and 'If-None-Match' not in self.headers and self.headers.get('If-Modified-Since'):
+                        try:
+                            since = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp()
+                            not_modified = int(st.st_mtime) <= since
+                        except (TypeError, ValueError):
+                            pass
+
+                    if not_modified:
+                        self.send_response(304)
+                        for header, value in cache_headers.items():
+                            self.send_header(header, value)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+
+                    cover = cover_cache.get(real_path, key, variant)
+                    if cover:
+                        img_data, img_mime = cover
                         self.send_response(200)
                         self.send_header('Content-type', img_mime)
                         self.send_header('Content-Length', str(len(img_data)))
+                        for header, value in cache_headers.items():
+                            self.send_header(header, value)
                         self.end_headers()
                         self.safe_write(img_data)
                     else:
@@ -3160,13 +5427,31 @@ class RequestHandler(SimpleHTTPRequestHandler):
             else:
                 self.send_error(404)
         
+        elif self.path == '/api/downloads':
+            self.send_json(download_manager.list())
+
+        elif self.path.startswith('/api/downloads/'):
+            job = download_manager.get(self.path[len('/api/downloads/'):])
+            if job:
+                self.send_json(job)
+            else:
+                self.send_error(404)
+
+        elif self.path.startswith('/api/yt-audio/'):
+            video_id = urllib.parse.urlparse(self.path).path[len('/api/yt-audio/'):]
+            if VIDEO_ID_RE.match(video_id):
+                self.serve_relay(video_id)
+            else:
+                self.send_error(400)
+
         elif self.path.startswith('/api/yt-stream'):
             query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
             vid_id = query.get('id', [None])[0]
             if vid_id:
                 stream_url = get_youtube_stream_url(vid_id)
                 if stream_url:
-                    self.send_json({"success": True, "url": stream_url})
+                    relay_url = f"/api/yt-audio/{vid_id}" if VIDEO_ID_RE.match(vid_id) else None
+                    self.send_json({"success": True, "url": stream_url, "relay_url": relay_url})
                 else:
                     self.send_json({"success": False, "error": "Stream not found"})
             else:
@@ -3177,7 +5462,14 @@ class RequestHandler(SimpleHTTPRequestHandler):
             q = query.get('q', [None])[0]
             if q:
                 results = search_youtube(q)
+                try:
+                    top_n = min(int(query.get('prefetch', [STREAM_PREFETCH_TOP_N])[0]), STREAM_PREFETCH_MAX_N)
+                except ValueError:
+                    top_n = STREAM_PREFETCH_TOP_N
                 self.send_json({"success": True, "results": results})
+                # Only after the response is out, so prefetching never delays the search itself
+                if STREAM_PREFETCH and top_n > 0:
+                    stream_prefetcher.schedule([r.get('id') for r in results[:top_n]])
             else:
                 self.send_error(400)
         else:
@@ -3201,52 +5493,338 @@ class RequestHandler(SimpleHTTPRequestHandler):
                 self.send_json({"success": True, "message": "Already exists"})
                 return
 
-            def run_download():
-                try:
-                    ydl_opts = {
-                        'format': 'bestaudio/best',
-                        'postprocessors': [{
-                            'key': 'FFmpegExtractAudio',
-                            'preferredcodec': 'mp3',
-                            'preferredquality': '192',
-                        }],
-                        'outtmpl': filepath.replace('.mp3', ''),
-                        'quiet': True,
-                        'no_warnings': True,
-                    }
-                    
-                    if youtube_id:
-                        url = f"https://www.youtube.com/watch?v={youtube_id}"
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            ydl.extract_info(url, download=True)
-                    else:
-                        search_query = f"{title} {artist} official audio"
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            ydl.extract_info(f"ytsearch:{search_query}", download=True)['entries'][0]
-                    
-                    set_metadata(filepath, title, artist, "", image_url)
-                except Exception as e:
-                    logging.error(f"Download failed: {e}")
+            try:
+                priority = int(data.get('priority', 0))
+            except (TypeError, ValueError):
+                priority = 0
+            job, created = download_manager.submit(title, artist, image_url, youtube_id, priority)
+            self.send_json({
+                "success": True,
+                "message": "Download started" if created else "Already queued",
+                "job_id": job['id']
+            })
 
-            threading.Thread(target=run_download).start()
-            self.send_json({"success": True, "message": "Download started"})
+        elif self.path.startswith('/api/downloads/') and self.path.endswith('/cancel'):
+            job_id = self.path[len('/api/downloads/'):-len('/cancel')]
+            if download_manager.cancel(job_id):
+                self.send_json({"success": True, "message": "Cancelled"})
+            else:
+                self.send_json({"success": False, "error": "No active job with that id"})
+        else:
+            self.send_error(404)
 
-    def send_json(self, obj):
+    def send_json(self, obj, headers=None):
+        if isinstance(obj, list) and len(obj) >= STREAM_JSON_MIN_ITEMS:
+            # Large lists are encoded incrementally instead of into one big buffer
+            self.send_json_stream(json.JSONEncoder().iterencode(obj), headers=headers)
+            return
+        body = json.dumps(obj).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
         self.end_headers()
         try:
-            self.wfile.write(json.dumps(obj).encode('utf-8'))
+            self.wfile.write(body)
         except (BrokenPipeError, ConnectionResetError, OSError):
             pass
 
+    def begin_stream(self, content_type, headers=None):
+        """Start a 200 response whose length is not known up front.
+
+        HTTP/1.1 clients get chunked transfer encoding so the connection can be
+        reused; anything else is delimited by closing the connection.
+        """
+        self._chunked = self.request_version == 'HTTP/1.1' and self.protocol_version == 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if self._chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
+        self.end_headers()
+
+    def write_chunk(self, data):
+        """Write part of a streamed body; returns False once the client is gone"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not data:
+            return True
+        try:
+            if self._chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+            return True
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            return False
+
+    def send_json_stream(self, fragments, content_type='application/json', headers=None):
+        """Stream an iterable of str fragments, flushing every STREAM_FLUSH_BYTES"""
+        self.begin_stream(content_type, headers)
+        buffer = []
+        buffered = 0
+        try:
+            for fragment in fragments:
+                buffer.append(fragment)
+                buffered += len(fragment)
+                if buffered >= STREAM_FLUSH_BYTES:
+                    if not self.write_chunk(''.join(buffer)):
+                        return
+                    buffer = []
+                    buffered = 0
+        except Exception as e:
+            # The body is already partly sent: leave it unterminated so the client sees the failure
+            logging.error(f"Streaming response failed: {e}")
+            self.close_connection = True
+            return
+        if self.write_chunk(''.join(buffer)) and self._chunked:
+            self.safe_write(b'0\r\n\r\n')
+
+    def send_ndjson(self, items, headers=None):
+        """Stream items as newline-delimited JSON, one object per line"""
+        self.send_json_stream((json.dumps(item) + '\n' for item in items), 'application/x-ndjson', headers)
+
+def json_items_object(items):
+    """Encode items as {"items": [...], "total": N} one fragment at a time"""
+    count = 0
+    yield '{"items": ['
+    for item in items:
+        yield (', ' if count else '') + json.dumps(item)
+        count += 1
+    yield f'], "total": {count}}}'
+
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     pass
 
-def start_server():
-    server = ThreadedHTTPServer(('0.0.0.0', PORT), RequestHandler)
-    print(f"Serving at http://0.0.0.0:{PORT}")
+# -----------------------------------------------------------------------------
+# ASYNC SERVER
+# -----------------------------------------------------------------------------
+
+class LoopWriter:
+    """File-like object that lets a worker thread write to an asyncio StreamWriter"""
+    def __init__(self, writer, loop):
+        self.writer = writer
+        self.loop = loop
+        self.bytes_written = 0
+        self.deferred = []
+
+    async def _write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def write(self, data):
+        if self.deferred:
+            # Keep ordering behind file segments still waiting to be sent
+            self.deferred.append(bytes(data))
+        else:
+            # Block the worker until the loop has drained the data (backpressure)
+            asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self.loop).result()
+        self.bytes_written += len(data)
+        return len(data)
+
+    def defer_file(self, path, offset, count):
+        """Queue a file segment for the event loop to send once the handler returns"""
+        self.deferred.append((path, offset, count))
+        self.bytes_written += count
+
+    def flush(self):
+        pass
+
+    async def send_deferred(self):
+        """Send queued segments from the loop; files go through loop.sendfile"""
+        for item in self.deferred:
+            if isinstance(item, bytes):
+                self.writer.write(item)
+                await self.writer.drain()
+                continue
+            path, offset, count = item
+            with open(path, 'rb') as f:
+                await self.loop.sendfile(self.writer.transport, f, offset, count)
+        self.deferred = []
+
+class AsyncRequestBridge(RequestHandler):
+    """Runs the RequestHandler route table for one request parsed by AsyncHTTPServer"""
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, raw_request, wfile, client_address):
+        # BaseRequestHandler.__init__ would read from a socket, so only set up
+        # what handle_one_request() needs.
+        self.rfile = io.BytesIO(raw_request)
+        self.wfile = wfile
+        self.client_address = client_address
+        self.server = None
+        # Static root for send_head (HEAD, unrouted GETs), as SimpleHTTPRequestHandler defaults it
+        self.directory = os.getcwd()
+        self.close_connection = True
+        self._length_known = False
+
+    def handle_expect_100(self):
+        """The server already answered 100-continue before reading the body"""
+        return True
+
+    def send_file_range(self, path, offset, count):
+        """Hand file bodies to the event loop so the worker is freed immediately"""
+        if count > 0:
+            self.wfile.defer_file(path, offset, count)
+
+    def send_header(self, keyword, value):
+        key = keyword.lower()
+        if key == 'content-length' or (key == 'transfer-encoding' and 'chunked' in value.lower()):
+            self._length_known = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        """Responses without a length can only be delimited by closing the connection"""
+        if not self._length_known:
+            self.send_header('Connection', 'close')
+        super().end_headers()
+
+class LoopEventQueue:
+    """LibraryIndex subscriber that hands events to an asyncio.Queue on the event loop"""
+    def __init__(self, loop, maxsize=LIBRARY_EVENT_QUEUE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put_nowait(self, event):
+        # Called from watcher threads; never raises queue.Full, overflow is handled on the loop
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow client: drop its backlog and tell it to reload everything
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "rescan", "path": library_index.directory, "version": event["version"]})
+
+def parse_request_head(head):
+    """Return (content_length, expects_continue) from a raw request head"""
+    content_length = 0
+    expects_continue = False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            content_length = int(value.strip() or 0)
+        elif name == b'expect' and value.strip().lower() == b'100-continue':
+            expects_continue = True
+    return content_length, expects_continue
+
+def is_long_stream(head):
+    """True for requests whose response streams for as long as the client listens"""
+    method, path = (head.split(b' ', 2) + [b''])[:2]
+    return method == b'GET' and (path.startswith(b'/api/yt-audio/') or
+                                 (path.startswith(b'/api/spotify') and b'/me/tracks' in path))
+
+class AsyncHTTPServer:
+    """HTTP/1.1 keep-alive server: connections live on the event loop, handlers on bounded pools.
+
+    Handlers write through LoopWriter and hold their worker thread until the
+    response is written, so long streamed responses run on a separate
+    stream_executor; ordinary requests always have max_workers threads.
+    """
+    def __init__(self, address, handler_class=AsyncRequestBridge, max_workers=ASYNC_WORKERS,
+                 stream_workers=ASYNC_STREAM_WORKERS, keepalive_timeout=KEEPALIVE_TIMEOUT):
+        self.address = address
+        self.handler_class = handler_class
+        self.keepalive_timeout = keepalive_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='musicc-worker')
+        self.stream_executor = ThreadPoolExecutor(max_workers=stream_workers, thread_name_prefix='musicc-stream')
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                try:
+                    content_length, expects_continue = parse_request_head(head)
+                except ValueError:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                    break
+                if expects_continue:
+                    writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(content_length), self.keepalive_timeout) if content_length else b''
+                except asyncio.TimeoutError:
+                    break  # client stalled mid-body
+
+                if head.split(b' ', 2)[:2] == [b'GET', b'/api/library/events']:
+                    # Long-lived event streams stay on the loop instead of pinning a worker
+                    await self.serve_library_events(writer)
+                    break
+
+                wfile = LoopWriter(writer, loop)
+                handler = self.handler_class(head + body, wfile, peer)
+                executor = self.stream_executor if is_long_stream(head) else self.executor
+                await loop.run_in_executor(executor, handler.handle_one_request)
+                await wfile.send_deferred()
+                await writer.drain()
+                # A route that wrote nothing leaves the client waiting; closing is the only signal
+                if handler.close_connection or not wfile.bytes_written:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logging.error(f"Async connection error: {e}")
+        finally:
+            writer.close()
+
+    async def serve_library_events(self, writer):
+        events = LoopEventQueue(asyncio.get_running_loop())
+        if library_index.subscribe(events) is None:
+            writer.write(b'HTTP/1.1 503 Service Unavailable\r\nRetry-After: %d\r\n'
+                         b'Content-Length: 0\r\nConnection: close\r\n\r\n' % LIBRARY_EVENTS_HEARTBEAT)
+            return
+        try:
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                         b'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n')
+            writer.write(library_events_hello().encode('utf-8'))
+            await writer.drain()
+            deadline = time.monotonic() + LIBRARY_EVENTS_MAX_AGE
+            while time.monotonic() < deadline:
+                try:
+                    event = await asyncio.wait_for(events.queue.get(), LIBRARY_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    event = None
+                writer.write(library_event_message(event).encode('utf-8'))
+                await writer.drain()
+        finally:
+            library_index.unsubscribe(events)
+
+    async def serve(self):
+        host, port = self.address
+        server = await asyncio.start_server(self.handle_connection, host, port, reuse_address=True)
+        async with server:
+            await server.serve_forever()
+
+    def serve_forever(self):
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.executor.shutdown(wait=False)
+            self.stream_executor.shutdown(wait=False)
+
+def start_server(mode=None):
+    mode = mode or SERVER_MODE
+    extractor_pool.warm()
+    if LIBRARY_WATCH:
+        library_index.start_watching()
+    if mode == 'async':
+        server = AsyncHTTPServer(('0.0.0.0', PORT))
+    else:
+        server = ThreadedHTTPServer(('0.0.0.0', PORT), RequestHandler)
+    print(f"Serving at http://0.0.0.0:{PORT} ({mode} mode)")
     server.serve_forever()
 
 if __name__ == '__main__':
-    start_server()
+    start_server('async' if '--async' in sys.argv else None)
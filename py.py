@@ -12,7 +12,6 @@ from datetime import datetime
 from pathlib import Path
 import sys
 import subprocess
-import requests
 from PIL import Image
 import io
 import imageio_ffmpeg
@@ -25,6 +24,15 @@ from collections import defaultdict
 import pickle
 import hashlib
 import random
+import sqlite3
+import atexit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from http_pool import http_client
+from library_watch import DirectoryWatcher
+from ytdl_pool import extractor_pool
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='ignore')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='ignore')
@@ -50,6 +58,20 @@ DURATION_TOLERANCE = 20
 OUTPUT_DIR = os.path.join(BASE_DIR, "downloaded_music")
 TRACKS_PER_PAGE = 50
 MAX_TRACKS = 5000
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.webm', '.flac', '.ogg')
+TRACK_CATALOG_DB = os.path.join(BASE_DIR, "track_catalog.db")
+FOLDER_CATALOG_DB = os.path.join(BASE_DIR, "folder_catalog.db")
+TRACK_CATALOG_VERSION = 2               # bump when the stored track dict format changes
+COVER_THUMBNAIL_SIZE = 300              # px, longest side of cover art sent to the UI
+COVER_CACHE_BYTES = 32 * 1024 * 1024
+COVER_CACHE_NONE_BYTES = 512            # charged against COVER_CACHE_BYTES per cached "no cover" result
+COVER_STORE_DIR = os.path.join(BASE_DIR, "covers")
+COVER_SERVER_PORT = 47815               # preferred loopback port; any free port if it is taken
+SCAN_WORKERS = min(8, (os.cpu_count() or 2) * 2)
+SCAN_BATCH_SIZE = 50                    # parsed tracks per incremental update sent to the UI
+SLOW_PARSE_SECONDS = 1.0                # files slower than this to parse are logged
+LIKED_FLUSH_DELAY = 1.0                 # seconds of like/unlike activity coalesced into one journal write
+LIKED_COMPACT_OPS = 500                 # journal entries before liked_tracks.json is rewritten
 
 # Spotify Configuration
 CLIENT_ID = "SET_ID_HERE"
@@ -488,16 +510,29 @@ class MusicClassifier:
 # PLAYLIST MANAGER
 # ============================================
 class PlaylistManager:
-    def __init__(self):
+    def __init__(self, track_catalog=None):
         self.playlists_file = os.path.join(BASE_DIR, "playlists.json")
         self.playlists = self.load_playlists()
+        self.save_lock = threading.Lock()
+        self.track_catalog = track_catalog or TrackCatalog(FOLDER_CATALOG_DB)
+        self.folder_scans = set()
+        self.folder_lock = threading.Lock()
+        self.on_folder_scan = None  # on_folder_scan(name, tracks, done, total, finished)
         
     def load_playlists(self):
         """Load playlists from file"""
         try:
             if os.path.exists(self.playlists_file):
                 with open(self.playlists_file, 'r') as f:
-                    return json.load(f)
+                    playlists = json.load(f)
+                # Older files inline covers as data URLs; move them into the cover store
+                for playlist in playlists.values():
+                    for track in playlist.get("tracks", []):
+                        thumbnail = track.get("thumbnail")
+                        if thumbnail and thumbnail.startswith('data:image'):
+                            track["cover_id"] = cover_store.put_data_url(thumbnail)
+                            track["thumbnail"] = None
+                return playlists
         except Exception as e:
             print(f"Error loading playlists: {e}")
         
@@ -522,7 +557,7 @@ class PlaylistManager:
     def save_playlists(self):
         """Save playlists to file"""
         try:
-            with open(self.playlists_file, 'w') as f:
+            with self.save_lock, open(self.playlists_file, 'w') as f:
                 json.dump(self.playlists, f, indent=2)
             return True
         except Exception as e:
@@ -599,8 +634,8 @@ class PlaylistManager:
         
         return False
     
-    def scan_folder_playlist(self, playlist_name):
-        """Scan folder for playlist"""
+    def scan_folder_playlist(self, playlist_name, on_batch=None):
+        """Scan folder for playlist, parsing only files the catalog has not seen at their current size and mtime"""
         if playlist_name not in self.playlists:
             return []
         
@@ -612,42 +647,93 @@ class PlaylistManager:
         if not os.path.exists(folder_path):
             return []
         
-        tracks = []
-        for file in os.listdir(folder_path):
-            if file.endswith(('.mp3', '.m4a', '.webm', '.flac', '.ogg')):
-                filename = os.path.splitext(file)[0]
-                parts = filename.split(' - ', 1)
-                if len(parts) == 2:
-                    artist, title = parts
-                    
-                    audio_file = os.path.join(folder_path, file)
-                    thumbnail = get_embedded_cover(audio_file)
-                    thumbnail_data = image_to_base64(thumbnail) if thumbnail else None
-                    
-                    duration = 0
-                    try:
-                        file_ext = os.path.splitext(audio_file)[1].lower()
-                        if file_ext == '.mp3':
-                            from mutagen.mp3 import MP3
-                            audio = MP3(audio_file)
-                            duration = audio.info.length
-                    except:
-                        pass
-                    
-                    tracks.append({
-                        "title": title,
-                        "artist": artist,
-                        "filepath": audio_file,
-                        "thumbnail": thumbnail_data,
-                        "duration": duration,
-                        "duration_str": format_time(duration),
-                        "filename": file
-                    })
+        listing = []
+        stale = {}
+        tracks = {}
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if not entry.name.endswith(AUDIO_EXTENSIONS):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                listing.append(entry.path)
+                track = self.track_catalog.lookup(entry.path, st)
+                if track is not None:
+                    tracks[entry.path] = cover_store.with_url(track)
+                else:
+                    stale[entry.path] = st
+        
+        parsed = library_scanner.scan(list(stale), self.read_folder_track, on_batch=on_batch)
+        changed = [(path, stale[path], track) for path, track in zip(stale, parsed) if track]
+        tracks.update((path, track) for path, _, track in changed)
+        removed = [path for path in self.track_catalog.paths_under(folder_path) if path not in tracks]
+        self.track_catalog.update(changed, removed)
         
+        tracks = [tracks[path] for path in listing if path in tracks]
         playlist["tracks"] = tracks
+        playlist["last_updated"] = datetime.now().isoformat()
         self.save_playlists()
         return tracks
     
+    def refresh_folder_playlist(self, playlist_name):
+        """Rescan a folder playlist in the background, streaming progress to on_folder_scan"""
+        with self.folder_lock:
+            if playlist_name in self.folder_scans:
+                return
+            self.folder_scans.add(playlist_name)
+        
+        def report(tracks, done, total, finished):
+            if self.on_folder_scan:
+                self.on_folder_scan(playlist_name, tracks, done, total, finished)
+        
+        def scan():
+            try:
+                tracks = self.scan_folder_playlist(
+                    playlist_name, on_batch=lambda batch, done, total: report(batch, done, total, False)
+                )
+                report(tracks, len(tracks), len(tracks), True)
+            except Exception as e:
+                print(f"Error scanning folder playlist {playlist_name}: {e}")
+            finally:
+                with self.folder_lock:
+                    self.folder_scans.discard(playlist_name)
+        
+        threading.Thread(target=scan, daemon=True).start()
+    
+    def read_folder_track(self, audio_file):
+        """Build the track dict for one file in a folder playlist, or None"""
+        file = os.path.basename(audio_file)
+        filename = os.path.splitext(file)[0]
+        parts = filename.split(' - ', 1)
+        if len(parts) != 2:
+            return None
+        artist, title = parts
+        
+        cover_id = cover_store.put(get_cover_thumbnail(audio_file))
+        
+        duration = 0
+        try:
+            file_ext = os.path.splitext(audio_file)[1].lower()
+            if file_ext == '.mp3':
+                from mutagen.mp3 import MP3
+                audio = MP3(audio_file)
+                duration = audio.info.length
+        except:
+            pass
+        
+        return {
+            "title": title,
+            "artist": artist,
+            "filepath": audio_file,
+            "cover_id": cover_id,
+            "thumbnail": cover_store.url(cover_id),
+            "duration": duration,
+            "duration_str": format_time(duration),
+            "filename": file
+        }
+    
     def get_playlist_tracks(self, playlist_name):
         """Get tracks from playlist"""
         if playlist_name not in self.playlists:
@@ -656,9 +742,9 @@ class PlaylistManager:
         playlist = self.playlists[playlist_name]
         
         if playlist["type"] == "folder":
-            return self.scan_folder_playlist(playlist_name)
-        else:
-            return playlist.get("tracks", [])
+            # Serve the last scan now; the rescan reports back through on_folder_scan
+            self.refresh_folder_playlist(playlist_name)
+        return [cover_store.with_url(track) for track in playlist.get("tracks", [])]
     
     def get_all_playlists(self):
         """Get all playlist names"""
@@ -678,7 +764,7 @@ def clean_filename(text):
 def download_thumbnail(url, temp_dir):
     """Download thumbnail image and return its path"""
     try:
-        response = requests.get(url, timeout=10)
+        response = http_client.get(url)
         response.raise_for_status()
         
         image = Image.open(io.BytesIO(response.content))
@@ -701,66 +787,235 @@ def download_thumbnail(url, temp_dir):
         return None
 
 def get_embedded_cover(audio_file):
-    """Extract embedded cover art from audio file"""
+    """Extract embedded cover art from audio file as (bytes, mime), without touching disk"""
     try:
         file_ext = os.path.splitext(audio_file)[1].lower()
         
-        if file_ext == '.webm':
-            return None
-            
         if file_ext == '.mp3':
-            try:
-                from mutagen.mp3 import MP3
-                from mutagen.id3 import ID3
-                
-                try:
-                    audio = MP3(audio_file, ID3=ID3)
-                except:
-                    audio = MP3(audio_file)
-                
-                if hasattr(audio, 'tags') and audio.tags:
-                    for tag in audio.tags.values():
-                        if hasattr(tag, 'mime') and tag.mime and tag.mime.startswith('image/'):
-                            import tempfile
-                            temp_dir = tempfile.mkdtemp()
-                            cover_path = os.path.join(temp_dir, 'cover.jpg')
-                            with open(cover_path, 'wb') as f:
-                                f.write(tag.data)
-                            return cover_path
-            except Exception as e:
-                pass
+            from mutagen.id3 import ID3
+            
+            # Only the tag block is needed, so skip MP3()'s audio frame scan
+            tags = ID3(audio_file)
+            for tag in tags.getall('APIC'):
+                if tag.mime and tag.mime.startswith('image/'):
+                    return tag.data, tag.mime
                 
         elif file_ext == '.m4a':
-            try:
-                from mutagen.mp4 import MP4
-                
-                audio = MP4(audio_file)
-                if 'covr' in audio:
-                    import tempfile
-                    temp_dir = tempfile.mkdtemp()
-                    cover_path = os.path.join(temp_dir, 'cover.jpg')
-                    with open(cover_path, 'wb') as f:
-                        f.write(audio['covr'][0])
-                    return cover_path
-            except:
-                pass
+            from mutagen.mp4 import MP4, MP4Cover
+            
+            audio = MP4(audio_file)
+            if 'covr' in audio:
+                cover = audio['covr'][0]
+                mime = 'image/png' if cover.imageformat == MP4Cover.FORMAT_PNG else 'image/jpeg'
+                return bytes(cover), mime
         
         return None
                 
     except Exception as e:
         return None
 
-def image_to_base64(image_path):
-    """Convert image to base64 data URL"""
+_cover_cache = OrderedDict()
+_cover_cache_bytes = 0
+_cover_cache_lock = threading.Lock()
+
+def _cover_cache_cost(cover):
+    return len(cover[0]) if cover else COVER_CACHE_NONE_BYTES
+
+def get_cover_thumbnail(audio_file, max_size=COVER_THUMBNAIL_SIZE):
+    """Embedded cover downsized to UI thumbnail size as (bytes, mime), cached by path, size and mtime"""
+    global _cover_cache_bytes
     try:
-        if image_path and os.path.exists(image_path):
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
-                encoded = base64.b64encode(image_data).decode('utf-8')
-                return f"data:image/jpeg;base64,{encoded}"
-    except Exception as e:
-        print(f"Error converting image to base64: {e}")
-    return None
+        st = os.stat(audio_file)
+    except OSError:
+        return None
+    key = (audio_file, st.st_size, st.st_mtime_ns, max_size)
+    with _cover_cache_lock:
+        if key in _cover_cache:
+            _cover_cache.move_to_end(key)
+            return _cover_cache[key]
+    
+    cover = get_embedded_cover(audio_file)
+    if cover:
+        try:
+            cover = make_thumbnail(cover[0], max_size) or cover
+        except Exception as e:
+            print(f"Error resizing cover for {audio_file}: {e}")
+    
+    with _cover_cache_lock:
+        # Another scan thread may have cached the same file meanwhile; count it once
+        if key not in _cover_cache:
+            _cover_cache[key] = cover
+            _cover_cache_bytes += _cover_cache_cost(cover)
+            while _cover_cache_bytes > COVER_CACHE_BYTES and _cover_cache:
+                _, evicted = _cover_cache.popitem(last=False)
+                _cover_cache_bytes -= _cover_cache_cost(evicted)
+    return cover
+
+def make_thumbnail(data, max_size=COVER_THUMBNAIL_SIZE):
+    """Downsize image bytes to a JPEG thumbnail; None if they are already small enough"""
+    image = Image.open(io.BytesIO(data))
+    if max(image.size) <= max_size and image.format == 'JPEG':
+        return None
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((max_size, max_size))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=85)
+    return out.getvalue(), 'image/jpeg'
+
+class CoverStore:
+    """Content-addressed cover thumbnails served over loopback HTTP.
+
+    Track dicts carry a short cover_id and a thumbnail URL instead of an inline
+    data URL, so bridge payloads and playlists.json stay small and the UI
+    only fetches the covers it actually renders.
+    """
+    def __init__(self, directory=COVER_STORE_DIR, port=COVER_SERVER_PORT):
+        self.directory = directory
+        self.preferred_port = port
+        self.port = None
+        os.makedirs(directory, exist_ok=True)
+    
+    def put(self, cover):
+        """Store (bytes, mime) cover art and return its id"""
+        if not cover:
+            return None
+        data, mime = cover
+        cover_id = hashlib.sha1(data).hexdigest()[:20]
+        path = self.path_for(cover_id, mime)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return cover_id
+    
+    def put_data_url(self, data_url):
+        """Move an inline data: URL into the store"""
+        try:
+            header, encoded = data_url.split(',', 1)
+            mime = header[len('data:'):].split(';')[0] or 'image/jpeg'
+            return self.put((base64.b64decode(encoded), mime))
+        except (ValueError, TypeError):
+            return None
+    
+    def path_for(self, cover_id, mime='image/jpeg'):
+        ext = 'png' if mime == 'image/png' else 'jpg'
+        return os.path.join(self.directory, f"{cover_id}.{ext}")
+    
+    def url(self, cover_id):
+        if not cover_id or self.port is None:
+            return None
+        return f"http://127.0.0.1:{self.port}/covers/{cover_id}"
+    
+    def with_url(self, track):
+        """Point a track's thumbnail at the current server address"""
+        if track.get("cover_id"):
+            track["thumbnail"] = self.url(track["cover_id"])
+        return track
+    
+    def start(self):
+        store = self
+        
+        class CoverHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def do_GET(self):
+                cover_id = self.path.rsplit('/', 1)[-1]
+                if not self.path.startswith('/covers/') or not re.fullmatch(r'[0-9a-f]{20}', cover_id):
+                    self.send_error(404)
+                    return
+                etag = f'"{cover_id}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                for mime in ('image/jpeg', 'image/png'):
+                    path = store.path_for(cover_id, mime)
+                    if os.path.exists(path):
+                        with open(path, 'rb') as f:
+                            data = f.read()
+                        self.send_response(200)
+                        self.send_header('Content-Type', mime)
+                        self.send_header('Content-Length', str(len(data)))
+                        self.send_header('ETag', etag)
+                        self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+                        self.end_headers()
+                        self.wfile.write(data)
+                        return
+                self.send_error(404)
+        
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', self.preferred_port), CoverHandler)
+        except OSError:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), CoverHandler)
+        server.daemon_threads = True
+        self.port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"🖼️ Serving cover thumbnails on http://127.0.0.1:{self.port}/covers/")
+
+cover_store = CoverStore()
+
+class LibraryScanner:
+    """Parses audio files on a shared thread pool and records how long each one took"""
+    def __init__(self, workers=SCAN_WORKERS):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='noir-scan')
+        self.lock = threading.Lock()
+        self.parse_times = {}
+        self.last_scan = None
+    
+    def _timed_parse(self, parse, path):
+        started = time.time()
+        try:
+            result = parse(path)
+        except Exception as e:
+            print(f"Error scanning {path}: {e}")
+            result = None
+        elapsed = time.time() - started
+        with self.lock:
+            self.parse_times[path] = elapsed
+        if elapsed > SLOW_PARSE_SECONDS:
+            print(f"🐢 Slow file: {os.path.basename(path)} took {elapsed:.2f}s to parse")
+        return result
+    
+    def scan(self, paths, parse, on_batch=None, batch_size=SCAN_BATCH_SIZE):
+        """Run parse(path) for every path in parallel; returns results in input order.
+        
+        on_batch(results, done, total) is called from this thread as results complete.
+        """
+        started = time.time()
+        futures = {self.executor.submit(self._timed_parse, parse, path): path for path in paths}
+        results = {}
+        batch = []
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_batch and result is not None:
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    on_batch(batch, len(results), len(paths))
+                    batch = []
+        if on_batch and batch:
+            on_batch(batch, len(results), len(paths))
+        with self.lock:
+            self.last_scan = {"files": len(paths), "seconds": round(time.time() - started, 3),
+                              "workers": self.workers}
+        return [results[path] for path in paths]
+    
+    def stats(self, slowest=20):
+        with self.lock:
+            worst = sorted(self.parse_times.items(), key=lambda item: item[1], reverse=True)[:slowest]
+            return {
+                "workers": self.workers,
+                "files_timed": len(self.parse_times),
+                "last_scan": self.last_scan,
+                "slowest": [{"path": path, "ms": round(seconds * 1000, 1)} for path, seconds in worst],
+            }
+
+library_scanner = LibraryScanner()
 
 def format_time(seconds):
     """Format seconds to MM:SS or HH:MM:SS"""
@@ -786,19 +1041,9 @@ def find_youtube_url(track_title, track_artist, spotify_duration):
         f"{track_title} {track_artist}"
     ]
     
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "quiet": True,
-        "skip_download": True,
-        "noplaylist": True,
-        "no_warnings": True,
-        "extract_flat": True,
-        "socket_timeout": 10,
-    }
-    
     for query in queries:
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with extractor_pool.acquire("search") as ydl:
                 search_result = ydl.extract_info(f"ytsearch3:{query}", download=False)
                 if not search_result or "entries" not in search_result:
                     continue
@@ -1256,7 +1501,6 @@ class SpotifyClient:
     
     def refresh_token(self, refresh_token):
         """Refresh an expired access token"""
-        import requests
         import base64
         import time
         
@@ -1277,7 +1521,7 @@ class SpotifyClient:
                 'refresh_token': refresh_token
             }
             
-            response = requests.post(token_url, headers=headers, data=data)
+            response = http_client.post(token_url, headers=headers, data=data)
             response.raise_for_status()
             
             token_info = response.json()
@@ -1320,7 +1564,6 @@ class SpotifyClient:
     
     def exchange_code_for_token(self, code):
         """Exchange authorization code for access token"""
-        import requests
         import base64
         import time
         
@@ -1342,7 +1585,7 @@ class SpotifyClient:
                 'redirect_uri': REDIRECT_URI
             }
             
-            response = requests.post(token_url, headers=headers, data=data)
+            response = http_client.post(token_url, headers=headers, data=data)
             response.raise_for_status()
             
             token_info = response.json()
@@ -1458,6 +1701,196 @@ class SpotifyClient:
             print(f"Error fetching all tracks: {e}")
             return []
 
+# ============================================
+# TRACK CATALOG
+# ============================================
+class TrackCatalog:
+    """Persistent cache of scanned track dicts, keyed by path and valid while size and mtime match"""
+    def __init__(self, db_path=TRACK_CATALOG_DB):
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS tracks ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data TEXT)'
+        )
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != TRACK_CATALOG_VERSION:
+            self.conn.execute('DELETE FROM tracks')
+            self.conn.execute(f'PRAGMA user_version = {TRACK_CATALOG_VERSION}')
+        self.conn.commit()
+        for path, size, mtime_ns, data in self.conn.execute('SELECT * FROM tracks'):
+            try:
+                self.rows[path] = (size, mtime_ns, json.loads(data))
+            except ValueError:
+                continue
+        self.hits = 0
+        self.misses = 0
+    
+    def lookup(self, path, st):
+        """Return the cached track for path if the file is unchanged, else None"""
+        with self.lock:
+            row = self.rows.get(path)
+            if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                self.hits += 1
+                return row[2]
+            self.misses += 1
+        return None
+    
+    def update(self, changed=(), removed=()):
+        """Store (path, stat, track) tuples and drop removed paths in one transaction"""
+        if not changed and not removed:
+            return
+        with self.lock:
+            for path, st, track in changed:
+                self.rows[path] = (st.st_size, st.st_mtime_ns, track)
+            for path in removed:
+                self.rows.pop(path, None)
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?)',
+                [(path, st.st_size, st.st_mtime_ns, json.dumps(track)) for path, st, track in changed]
+            )
+            self.conn.executemany('DELETE FROM tracks WHERE path = ?', [(path,) for path in removed])
+            self.conn.commit()
+    
+    def paths_under(self, directory):
+        directory = os.path.normpath(directory)
+        with self.lock:
+            return [path for path in self.rows if os.path.normpath(os.path.dirname(path)) == directory]
+    
+    def tracks_under(self, directory):
+        directory = os.path.normpath(directory)
+        with self.lock:
+            return [dict(row[2]) for path, row in self.rows.items()
+                    if os.path.normpath(os.path.dirname(path)) == directory]
+
+# ============================================
+# LIKED TRACKS STORE
+# ============================================
+def liked_track_id(artist, title):
+    return hashlib.md5(f"{artist}_{title}".encode()).hexdigest()
+
+class LikedTracksStore:
+    """Liked tracks indexed by track_id, persisted as a JSON snapshot plus an append-only journal.
+    
+    Likes and unlikes update the index immediately; journal lines are written
+    in one batch LIKED_FLUSH_DELAY seconds later, and the snapshot is only
+    rewritten once the journal grows past LIKED_COMPACT_OPS entries.
+    """
+    def __init__(self, snapshot_file):
+        self.snapshot_file = snapshot_file
+        self.journal_file = snapshot_file + ".journal"
+        self.lock = threading.Lock()
+        self.tracks = {}
+        self.pending = []
+        self.journal_ops = 0
+        self.flush_timer = None
+        self.load()
+        atexit.register(self.flush)
+    
+    def load(self):
+        try:
+            if os.path.exists(self.snapshot_file):
+                with open(self.snapshot_file, 'r') as f:
+                    for track in json.load(f):
+                        self.tracks[track['track_id']] = track
+        except Exception as e:
+            print(f"Error loading liked tracks: {e}")
+        
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash mid-write
+                    if op.get('op') == 'like':
+                        self.tracks[op['track']['track_id']] = op['track']
+                    elif op.get('op') == 'unlike':
+                        self.tracks.pop(op['track_id'], None)
+            self.compact()
+        
+        # Older snapshots inline covers as data URLs; move them into the cover store
+        migrated = False
+        for track in self.tracks.values():
+            thumbnail = track.get("thumbnail")
+            if thumbnail and thumbnail.startswith('data:image'):
+                track["cover_id"] = cover_store.put_data_url(thumbnail)
+                track["thumbnail"] = None
+                migrated = True
+        if migrated:
+            self.compact()
+    
+    def __len__(self):
+        return len(self.tracks)
+    
+    def get(self, track_id):
+        return self.tracks.get(track_id)
+    
+    def contains(self, track_id):
+        return track_id in self.tracks
+    
+    def list(self):
+        with self.lock:
+            return list(self.tracks.values())
+    
+    def add(self, track):
+        """Add a track; returns False if it was already liked"""
+        with self.lock:
+            if track['track_id'] in self.tracks:
+                return False
+            self.tracks[track['track_id']] = track
+            self._log({"op": "like", "track": track})
+        return True
+    
+    def remove(self, track_id):
+        """Remove a track; returns False if it was not liked"""
+        with self.lock:
+            if self.tracks.pop(track_id, None) is None:
+                return False
+            self._log({"op": "unlike", "track_id": track_id})
+        return True
+    
+    def _log(self, op):
+        self.pending.append(op)
+        if self.flush_timer is None:
+            self.flush_timer = threading.Timer(LIKED_FLUSH_DELAY, self.flush)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
+    
+    def flush(self):
+        """Append pending operations to the journal, compacting it when it gets long"""
+        with self.lock:
+            if self.flush_timer:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            pending, self.pending = self.pending, []
+            if not pending:
+                return
+            try:
+                with open(self.journal_file, 'a') as f:
+                    f.write(''.join(json.dumps(op) + '\n' for op in pending))
+                self.journal_ops += len(pending)
+            except Exception as e:
+                print(f"Error saving liked tracks: {e}")
+                self.pending = pending + self.pending
+                return
+        if self.journal_ops >= LIKED_COMPACT_OPS:
+            self.compact()
+    
+    def compact(self):
+        """Rewrite the snapshot from the index and truncate the journal"""
+        with self.lock:
+            try:
+                tmp_file = self.snapshot_file + ".tmp"
+                with open(tmp_file, 'w') as f:
+                    json.dump(list(self.tracks.values()), f)
+                os.replace(tmp_file, self.snapshot_file)
+                if os.path.exists(self.journal_file):
+                    os.remove(self.journal_file)
+                self.journal_ops = 0
+            except Exception as e:
+                print(f"Error saving liked tracks: {e}")
+
 # ============================================
 # MAIN NOIRPLAYER CLASS (COMPLETE)
 # ============================================
@@ -1467,12 +1900,20 @@ class NoirPlayer:
         self.settings = SettingsManager()
         self.player = MediaPlayer()
         self.classifier = MusicClassifier()
+        cover_store.start()
         self.playlist_manager = PlaylistManager()
+        self.playlist_manager.on_folder_scan = self.notify_playlist_scan
+        self.track_catalog = TrackCatalog()
         
         self.tracks = []
         self.downloaded_tracks = []
-        self.liked_tracks = []
+        self.downloaded_index = {}
+        self.downloaded_lock = threading.Lock()
+        self.downloads_watcher = None
+        self.scan_generation = 0
+        self.changed_during_scan = set()
         self.liked_tracks_file = os.path.join(BASE_DIR, "liked_tracks.json")
+        self.liked = None
         self.playlists = {}
         self.current_playlist = "Downloads"
         self.downloading = False
@@ -1491,7 +1932,7 @@ class NoirPlayer:
         initial_volume = self.settings.get_setting("volume", 0.7)
         self.player.set_volume(initial_volume)
         
-        self.scan_downloaded_tracks()
+        self.watch_downloaded_tracks()
         self.load_liked_tracks()
     
     # ============================================
@@ -1500,24 +1941,17 @@ class NoirPlayer:
     
     def load_liked_tracks(self):
         """Load liked tracks from file"""
-        try:
-            if os.path.exists(self.liked_tracks_file):
-                with open(self.liked_tracks_file, 'r') as f:
-                    self.liked_tracks = json.load(f)
-                print(f"✅ Loaded {len(self.liked_tracks)} liked tracks")
-        except Exception as e:
-            print(f"Error loading liked tracks: {e}")
-            self.liked_tracks = []
+        self.liked = LikedTracksStore(self.liked_tracks_file)
+        print(f"✅ Loaded {len(self.liked)} liked tracks")
+    
+    @property
+    def liked_tracks(self):
+        return self.liked.list()
     
     def save_liked_tracks(self):
-        """Save liked tracks to file"""
-        try:
-            with open(self.liked_tracks_file, 'w') as f:
-                json.dump(self.liked_tracks, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving liked tracks: {e}")
-            return False
+        """Write pending like/unlike changes to disk now"""
+        self.liked.flush()
+        return True
     
     def like_track(self, track_data):
         """Like a track (works for Spotify, downloaded, streamed, discovered)"""
@@ -1527,12 +1961,11 @@ class NoirPlayer:
                 return {"success": False, "message": "Track data incomplete"}
             
             # Generate unique ID
-            track_id = hashlib.md5(f"{track_data['artist']}_{track_data['title']}".encode()).hexdigest()
+            track_id = liked_track_id(track_data['artist'], track_data['title'])
             
             # Check if already liked
-            for track in self.liked_tracks:
-                if track.get('track_id') == track_id:
-                    return {"success": False, "message": "Track already liked"}
+            if self.liked.contains(track_id):
+                return {"success": False, "message": "Track already liked"}
             
             # Add metadata
             liked_track = {
@@ -1541,6 +1974,7 @@ class NoirPlayer:
                 "artist": track_data.get('artist', 'Unknown'),
                 "album": track_data.get('album', 'Unknown Album'),
                 "duration": track_data.get('duration', 0),
+                "cover_id": track_data.get('cover_id'),
                 "thumbnail": track_data.get('thumbnail'),
                 "source": track_data.get('source', 'unknown'),
                 "youtube_url": track_data.get('youtube_url'),
@@ -1551,8 +1985,7 @@ class NoirPlayer:
             }
             
             # Add to liked tracks
-            self.liked_tracks.append(liked_track)
-            self.save_liked_tracks()
+            self.liked.add(liked_track)
             
             # Update recommendations
             self.classifier.log_play(liked_track)
@@ -1570,11 +2003,7 @@ class NoirPlayer:
     def unlike_track(self, track_id):
         """Unlike a track by track_id"""
         try:
-            initial_count = len(self.liked_tracks)
-            self.liked_tracks = [t for t in self.liked_tracks if t.get('track_id') != track_id]
-            
-            if len(self.liked_tracks) < initial_count:
-                self.save_liked_tracks()
+            if self.liked.remove(track_id):
                 return {"success": True, "message": "Track unliked"}
             else:
                 return {"success": False, "message": "Track not found in likes"}
@@ -1586,17 +2015,25 @@ class NoirPlayer:
     def is_track_liked(self, artist, title):
         """Check if a track is liked"""
         try:
-            track_id = hashlib.md5(f"{artist}_{title}".encode()).hexdigest()
-            for track in self.liked_tracks:
-                if track.get('track_id') == track_id:
-                    return {"success": True, "is_liked": True, "track": track}
+            track = self.liked.get(liked_track_id(artist, title))
+            if track:
+                return {"success": True, "is_liked": True, "track": track}
             return {"success": True, "is_liked": False}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def are_tracks_liked(self, tracks):
+        """Check a list of {artist, title} at once; returns flags in the same order"""
+        try:
+            return {"success": True, "liked": [
+                self.liked.contains(liked_track_id(t.get('artist', ''), t.get('title', ''))) for t in tracks
+            ]}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
     def get_liked_tracks_list(self):
         """Get all liked tracks"""
-        return self.liked_tracks
+        return [cover_store.with_url(track) for track in self.liked.list()]
     
     # ============================================
     # PLAYLIST FUNCTIONS - FIXED
@@ -1643,6 +2080,7 @@ class NoirPlayer:
                         "artist": track["artist"],
                         "duration": track.get("duration", 0),
                         "duration_str": track.get("duration_str", "0:00"),
+                        "cover_id": track.get("cover_id"),
                         "thumbnail": track.get("thumbnail"),
                         "filepath": track.get("filepath"),
                         "filename": track.get("filename")
@@ -1651,6 +2089,10 @@ class NoirPlayer:
                 self.playlist_manager.playlists["Downloads"]["tracks"] = playlist_tracks
                 self.playlist_manager.playlists["Downloads"]["last_updated"] = datetime.now().isoformat()
             
+            for name, playlist in list(self.playlist_manager.playlists.items()):
+                if playlist.get("type") == "folder":
+                    self.playlist_manager.refresh_folder_playlist(name)
+            
             return self.playlist_manager.playlists
         except Exception as e:
             print(f"Error getting playlists: {e}")
@@ -1833,17 +2275,7 @@ class NoirPlayer:
     def search_youtube_music(self, query, limit=10):
         """Search YouTube for music"""
         try:
-            ydl_opts = {
-                "format": "bestaudio/best",
-                "quiet": True,
-                "skip_download": True,
-                "noplaylist": True,
-                "no_warnings": True,
-                "extract_flat": True,
-                "socket_timeout": 10,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with extractor_pool.acquire("search") as ydl:
                 search_result = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
                 if not search_result or "entries" not in search_result:
                     return []
@@ -2345,60 +2777,216 @@ class NoirPlayer:
                 'youtube_count': 0
             }
     
-    def scan_downloaded_tracks(self):
+    def read_downloaded_track(self, audio_file):
+        """Build the track dict for one file in the download directory, or None"""
+        output_dir = os.path.dirname(audio_file)
+        file = os.path.basename(audio_file)
+        if not file.endswith(AUDIO_EXTENSIONS):
+            return None
+        
+        filename = os.path.splitext(file)[0]
+        parts = filename.split(' - ', 1)
+        if len(parts) != 2:
+            return None
+        artist, title = parts
+        
+        cover = get_cover_thumbnail(audio_file)
+        
+        if not cover:
+            for cover_ext in ['.jpg', '.jpeg', '.png']:
+                cover_file = os.path.join(output_dir, f"{artist} - {title}{cover_ext}")
+                if os.path.exists(cover_file):
+                    try:
+                        with open(cover_file, 'rb') as f:
+                            data = f.read()
+                        cover = make_thumbnail(data) or (data, 'image/png' if cover_ext == '.png' else 'image/jpeg')
+                    except Exception as e:
+                        print(f"Error reading cover {cover_file}: {e}")
+                    break
+        cover_id = cover_store.put(cover)
+        
+        duration = 0
+        try:
+            file_ext = os.path.splitext(audio_file)[1].lower()
+            if file_ext == '.mp3':
+                from mutagen.mp3 import MP3
+                audio = MP3(audio_file)
+                duration = audio.info.length
+            elif file_ext == '.m4a':
+                from mutagen.mp4 import MP4
+                audio = MP4(audio_file)
+                duration = audio.info.length
+        except:
+            pass
+        
+        return {
+            "title": title,
+            "artist": artist,
+            "filename": file,
+            "filepath": audio_file,
+            "downloaded_at": os.path.getmtime(audio_file),
+            "cover_id": cover_id,
+            "thumbnail": cover_store.url(cover_id),
+            "duration": duration,
+            "duration_str": format_time(duration)
+        }
+    
+    def load_downloaded_track(self, audio_file, st=None):
+        """Return the track dict for a file, parsing it only if the catalog entry is stale"""
+        st = st or os.stat(audio_file)
+        track = self.track_catalog.lookup(audio_file, st)
+        if track is not None:
+            cover_store.with_url(track)
+        else:
+            track = self.read_downloaded_track(audio_file)
+            if track:
+                self.track_catalog.update(changed=[(audio_file, st, track)])
+        return track
+    
+    def scan_downloaded_tracks(self, on_batch=None, generation=None):
         """Scan the download directory for already downloaded tracks"""
-        self.downloaded_tracks = []
+        with self.downloaded_lock:
+            generation = self.scan_generation if generation is None else generation
+            self.changed_during_scan = set()
+        cached = {}
+        stale = {}
         output_dir = self.settings.get_setting("output_dir", OUTPUT_DIR)
         
         if os.path.exists(output_dir):
-            for file in os.listdir(output_dir):
-                if file.endswith(('.mp3', '.m4a', '.webm', '.flac', '.ogg')):
-                    if file.endswith(('.jpg', '.jpeg', '.png')):
+            with os.scandir(output_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(AUDIO_EXTENSIONS):
                         continue
-                    
-                    filename = os.path.splitext(file)[0]
-                    parts = filename.split(' - ', 1)
-                    if len(parts) == 2:
-                        artist, title = parts
-                        
-                        audio_file = os.path.join(output_dir, file)
-                        
-                        cover_data = None
-                        embedded_cover_path = get_embedded_cover(audio_file)
-                        if embedded_cover_path:
-                            cover_data = image_to_base64(embedded_cover_path)
-                        
-                        if not cover_data:
-                            for cover_ext in ['.jpg', '.jpeg', '.png']:
-                                cover_file = os.path.join(output_dir, f"{artist} - {title}{cover_ext}")
-                                if os.path.exists(cover_file):
-                                    cover_data = image_to_base64(cover_file)
-                                    break
-                        
-                        duration = 0
-                        try:
-                            file_ext = os.path.splitext(audio_file)[1].lower()
-                            if file_ext == '.mp3':
-                                from mutagen.mp3 import MP3
-                                audio = MP3(audio_file)
-                                duration = audio.info.length
-                            elif file_ext == '.m4a':
-                                from mutagen.mp4 import MP4
-                                audio = MP4(audio_file)
-                                duration = audio.info.length
-                        except:
-                            pass
-                        
-                        self.downloaded_tracks.append({
-                            "title": title,
-                            "artist": artist,
-                            "filename": file,
-                            "filepath": audio_file,
-                            "downloaded_at": os.path.getmtime(audio_file),
-                            "thumbnail": cover_data,
-                            "duration": duration,
-                            "duration_str": format_time(duration)
-                        })
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    track = self.track_catalog.lookup(entry.path, st)
+                    if track is not None:
+                        cached[entry.path] = cover_store.with_url(track)
+                    else:
+                        stale[entry.path] = st
+        
+        # Only new or changed files are parsed, fanned out across the scan pool
+        parsed = library_scanner.scan(list(stale), self.read_downloaded_track, on_batch=on_batch)
+        changed = [(path, stale[path], track) for path, track in zip(stale, parsed) if track]
+        index = dict(cached)
+        index.update((path, track) for path, _, track in changed)
+        
+        removed = [path for path in self.track_catalog.paths_under(output_dir) if path not in index]
+        self.track_catalog.update(changed, removed)
+        if changed or removed:
+            print(f"📚 Track catalog: {len(changed)} parsed, {len(removed)} removed, {len(cached)} cached")
+        
+        with self.downloaded_lock:
+            if generation != self.scan_generation:
+                return  # output_dir changed while this scan ran
+            # Watcher events that arrived mid-scan are newer than the listing
+            for path in self.changed_during_scan:
+                if path in self.downloaded_index:
+                    index[path] = self.downloaded_index[path]
+                else:
+                    index.pop(path, None)
+            self.downloaded_index = index
+            self.downloaded_tracks = list(index.values())
+    
+    def watch_downloaded_tracks(self):
+        """Serve the catalog right away, then rescan and watch the download directory in the background"""
+        if self.downloads_watcher:
+            self.downloads_watcher.stop()
+        output_dir = self.settings.get_setting("output_dir", OUTPUT_DIR)
+        index = {track["filepath"]: cover_store.with_url(track) for track in self.track_catalog.tracks_under(output_dir)}
+        with self.downloaded_lock:
+            self.scan_generation += 1
+            generation = self.scan_generation
+            self.downloaded_index = index
+            self.downloaded_tracks = list(index.values())
+        
+        # Watch before scanning so files that land during the cold scan are not missed
+        watcher = DirectoryWatcher(
+            output_dir,
+            lambda kind, path, dest=None: self.on_downloads_changed(kind, path, dest, generation),
+            suffixes=AUDIO_EXTENSIONS
+        )
+        backend = watcher.start()
+        self.downloads_watcher = watcher
+        print(f"👀 Watching {output_dir} for library changes ({backend})")
+        
+        def on_batch(tracks, done, total):
+            if generation == self.scan_generation:
+                self.notify_scan_batch(tracks, done, total)
+        
+        def scan():
+            self.scan_downloaded_tracks(on_batch=on_batch, generation=generation)
+            if generation == self.scan_generation:
+                self.notify_library_changed('rescan', output_dir)
+        
+        threading.Thread(target=scan, daemon=True).start()
+    
+    def on_downloads_changed(self, kind, path, dest=None, generation=None):
+        """Apply one watcher event to the downloaded-tracks catalog and notify the UI"""
+        if generation is not None and generation != self.scan_generation:
+            return  # event from a watcher on a previous output_dir
+        if kind == 'rescan':
+            self.scan_downloaded_tracks(on_batch=self.notify_scan_batch, generation=generation)
+        else:
+            source = path
+            if kind == 'moved':
+                path = dest
+            try:
+                track = self.load_downloaded_track(path) if kind != 'deleted' else None
+            except OSError:
+                track = None
+            if track is None:
+                self.track_catalog.update(removed=[path])
+            if source != path:
+                self.track_catalog.update(removed=[source])
+            with self.downloaded_lock:
+                if generation is not None and generation != self.scan_generation:
+                    return
+                self.changed_during_scan.update((source, path))
+                if source != path:
+                    self.downloaded_index.pop(source, None)
+                if track:
+                    self.downloaded_index[path] = track
+                else:
+                    self.downloaded_index.pop(path, None)
+                self.downloaded_tracks = list(self.downloaded_index.values())
+        self.notify_library_changed(kind, dest or path)
+    
+    def notify_scan_batch(self, tracks, done, total):
+        """Stream freshly parsed tracks to the frontend while a scan is running"""
+        if not self.window:
+            return
+        batch = json.dumps({"tracks": tracks, "done": done, "total": total})
+        try:
+            self.window.evaluate_js(f"window.onLibraryScanBatch && window.onLibraryScanBatch({batch})")
+        except Exception as e:
+            print(f"Library scan notification failed: {e}")
+    
+    def notify_playlist_scan(self, name, tracks, done, total, finished):
+        """Stream folder playlist scan results to the frontend"""
+        if not self.window:
+            return
+        scan = json.dumps({"name": name, "tracks": tracks, "done": done, "total": total, "finished": finished})
+        try:
+            self.window.evaluate_js(f"window.onPlaylistScan && window.onPlaylistScan({scan})")
+        except Exception as e:
+            print(f"Playlist scan notification failed: {e}")
+    
+    def get_scan_stats(self):
+        """Per-file parse times from the library scanner, slowest first"""
+        return library_scanner.stats()
+    
+    def notify_library_changed(self, kind, path):
+        """Push a change notification to the frontend, if it is loaded"""
+        if not self.window:
+            return
+        event = json.dumps({"type": kind, "path": path, "count": len(self.downloaded_tracks)})
+        try:
+            self.window.evaluate_js(f"window.onLibraryChanged && window.onLibraryChanged({event})")
+        except Exception as e:
+            print(f"Library change notification failed: {e}")
     
     def is_track_downloaded(self, track):
         """Check if a track is already downloaded"""
@@ -2415,7 +3003,8 @@ class NoirPlayer:
     
     def get_downloaded_tracks(self):
         """Get list of downloaded tracks"""
-        self.scan_downloaded_tracks()
+        if not self.downloads_watcher:
+            self.scan_downloaded_tracks()
         return self.downloaded_tracks
     
     # ============================================
@@ -2437,7 +3026,7 @@ class NoirPlayer:
         
         if "output_dir" in new_settings:
             os.makedirs(new_settings["output_dir"], exist_ok=True)
-            self.scan_downloaded_tracks()
+            self.watch_downloaded_tracks()
         
         return self.settings.save_settings()
     
@@ -2633,7 +3222,8 @@ class NoirPlayer:
             
             if success:
                 self.tracks[track_index]["downloaded"] = True
-                self.scan_downloaded_tracks()
+                if not self.downloads_watcher:
+                    self.scan_downloaded_tracks()
                 return {
                     "success": True,
                     "message": "Downloaded successfully",
@@ -2705,19 +3295,9 @@ class NoirPlayer:
         all_results = []
         seen_urls = set()
         
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "quiet": True,
-            "skip_download": True,
-            "noplaylist": True,
-            "no_warnings": True,
-            "extract_flat": True,
-            "socket_timeout": 10,
-        }
-        
         for query in queries:
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                with extractor_pool.acquire("search") as ydl:
                     search_result = ydl.extract_info(f"ytsearch10:{query}", download=False)
                     if not search_result or "entries" not in search_result:
                         continue
@@ -2782,23 +3362,13 @@ class NoirPlayer:
                     video_id = video_id_match.group(1)
                     thumbnail = f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
                     
-                    import requests
-                    response = requests.head(thumbnail, timeout=5)
+                    response = http_client.head(thumbnail, timeout=5)
                     if response.status_code != 200:
                         thumbnail = f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
             except:
                 thumbnail = original_track.get("thumbnail")
             
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'socket_timeout': 10,
-                'noplaylist': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with extractor_pool.acquire("extract") as ydl:
                 info = ydl.extract_info(youtube_url, download=False)
                 
                 stream_url = None
@@ -2853,27 +3423,8 @@ class NoirPlayer:
         try:
             print(f"Getting streaming URL for: {youtube_url}")
             
-            # Create a new yt-dlp instance with proper settings for streaming
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'socket_timeout': 15,
-                'noplaylist': True,
-                'no_color': True,
-                'prefer_ffmpeg': False,
-                'postprocessors': [],
-                # Add these options for better streaming support
-                'noprogress': True,
-                'skip_download': True,
-                'forceurl': True,
-                'force_generic_extractor': False,
-                'extract_audio': True,
-                'audio_format': 'best',
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # Borrow a warm yt-dlp instance set up for full extraction
+            with extractor_pool.acquire("extract") as ydl:
                 info = ydl.extract_info(youtube_url, download=False)
                 
                 # Try to get a direct audio stream URL
@@ -3033,24 +3584,14 @@ class NoirPlayer:
                     video_id = video_id_match.group(1)
                     thumbnail = f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
                     
-                    import requests
-                    response = requests.head(thumbnail, timeout=5)
+                    response = http_client.head(thumbnail, timeout=5)
                     if response.status_code != 200:
                         thumbnail = f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
             except:
                 if original_track:
                     thumbnail = original_track.get("thumbnail")
             
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'socket_timeout': 10,
-                'noplaylist': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with extractor_pool.acquire("extract") as ydl:
                 info = ydl.extract_info(youtube_url, download=False)
                 
                 stream_url = None
@@ -3644,6 +4185,7 @@ class NoirPlayer:
             self.load_tracks,
             self.download_track,
             self.get_downloaded_tracks,
+            self.get_scan_stats,
             self.check_ffmpeg,
             self.get_settings,
             self.update_settings,
@@ -3707,6 +4249,7 @@ class NoirPlayer:
             self.like_track,
             self.unlike_track,
             self.is_track_liked,
+            self.are_tracks_liked,
             self.get_liked_tracks_list
         )
         
@@ -0,0 +1,101 @@
+"""Pool of warm yt_dlp.YoutubeDL instances shared by main.py and py.py.
+
+Building a YoutubeDL loads the extractor tables and opens fresh HTTP
+sessions, so the search/extract hot paths check an instance out of a pool
+grouped by option profile instead of constructing one per call. A
+YoutubeDL is not safe for concurrent use, so each instance is handed to one
+thread at a time. Downloads keep building their own instance because their
+options (output template, progress hooks) differ per job.
+"""
+import contextlib
+import queue
+import threading
+
+import yt_dlp
+
+PROFILES = {
+    # ytsearchN: lookups that only need ids, titles and durations
+    "search": {
+        "format": "bestaudio/best",
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+        "noplaylist": True,
+        "extract_flat": True,
+        "socket_timeout": 10,
+    },
+    # Full extraction of a single video to resolve stream URLs
+    "extract": {
+        "format": "bestaudio/best",
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+        "noplaylist": True,
+        "extract_flat": False,
+        "socket_timeout": 15,
+    },
+}
+POOL_SIZE = 4                 # max instances per profile
+
+
+class ExtractorPool:
+    def __init__(self, profiles=PROFILES, size=POOL_SIZE):
+        self.profiles = profiles
+        self.size = size
+        self.idle = {name: queue.LifoQueue() for name in profiles}
+        self.created = {name: 0 for name in profiles}
+        self.checkouts = {name: 0 for name in profiles}
+        self.waits = {name: 0 for name in profiles}
+        self.lock = threading.Lock()
+
+    def _checkout(self, profile):
+        idle = self.idle[profile]
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created[profile] < self.size:
+                self.created[profile] += 1
+                return yt_dlp.YoutubeDL(dict(self.profiles[profile]))
+            self.waits[profile] += 1
+        return idle.get()
+
+    @contextlib.contextmanager
+    def acquire(self, profile):
+        """Borrow a YoutubeDL configured for profile; it goes back to the pool afterwards"""
+        ydl = self._checkout(profile)
+        with self.lock:
+            self.checkouts[profile] += 1
+        try:
+            yield ydl
+        finally:
+            self.idle[profile].put(ydl)
+
+    def extract_info(self, profile, url):
+        with self.acquire(profile) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    def in_use(self, profile):
+        """Number of instances of profile currently checked out"""
+        with self.lock:
+            return self.created[profile] - self.idle[profile].qsize()
+
+    def warm(self, *profiles):
+        """Build instances ahead of the first request, in the background"""
+        def build():
+            for profile in profiles or self.profiles:
+                with self.acquire(profile):
+                    pass
+        threading.Thread(target=build, daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {"instances": self.created[name], "idle": self.idle[name].qsize(),
+                       "checkouts": self.checkouts[name], "waits": self.waits[name]}
+                for name in self.profiles
+            }
+
+
+extractor_pool = ExtractorPool()